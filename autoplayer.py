@@ -0,0 +1,139 @@
+"""
+Automatic players of play2048, run into separate processes, one per player,
+which live along the whole game: this makes the GUI more reactive,
+and strategies keep their state (tables, caches) from a move to the next.
+
+This module is all that these processes need from the GUI: they import
+neither tkinter nor the modules of unused players.
+"""
+
+import random
+import traceback
+from multiprocessing import Process, Pipe
+
+import rules
+import config
+import cli
+
+
+def autoplayer_dir(board, strategy):
+    """run a direction strategy and return its result (-1 on failure)"""
+    try:
+        res = strategy(board)
+        assert res >= 0
+        return res
+    except:
+        traceback.print_exc()
+        return -1
+
+
+def autoplayer_tile(board, strategy):
+    """run a tile strategy and return its encoded result (-1 on failure)"""
+    try:
+        i, j, k = strategy(board)
+        res = (i * rules.SIZE + j) * 2 + k - 1
+        assert res >= 0
+        return res
+    except:
+        traceback.print_exc()
+        return -1
+
+
+AUTOPLAYER = autoplayer_tile, autoplayer_dir
+
+
+def autoplayer_loop(conn, player, strategy, settings):
+    """body of an AutoPlayer process: answer each board received on 'conn'.
+       'settings' are the values of config set by the options of the run
+       (a spawned process imports config.py afresh). Its random numbers are
+       seeded from config.SEED and 'player' if config.SEED is not None."""
+    for name, value in settings.items():
+        setattr(config, name, value)
+    rules.set_size(config.BOARD_SIZE)
+    if config.SEED is not None:
+        random.seed("{0}:{1}".format(config.SEED, player))
+    while True:
+        try:
+            board = conn.recv()
+        except EOFError:
+            return
+        if board is None:
+            return
+        conn.send(AUTOPLAYER[player](board, strategy))
+
+
+class AutoPlayer:
+    """Process running the strategy of an automatic player on the boards
+       it is sent through a pipe, from a move to the next.
+       It is restarted with a fresh state after a failure."""
+
+    def __init__(self, player, strategy):
+        self.player = player
+        self.strategy = strategy
+        self.process = None
+        self.conn = None
+        self.board = None  # board being played
+        self.restarts = 0  # restarts for the current board
+
+    def start(self):
+        self.conn, child = Pipe()
+        self.process = Process(target=autoplayer_loop,
+                               args=(child, self.player, self.strategy,
+                                     {name: getattr(config, name)
+                                      for name in cli.OPTIONS.values()}),
+                               daemon=True)
+        self.process.start()
+        child.close()
+
+    def play(self, board):
+        """send 'board' to the process (started if needed)"""
+        if self.process is None or not self.process.is_alive():
+            self.cancel()
+            self.start()
+        self.board = board
+        self.conn.send(board)
+
+    def result(self):
+        """result of the current board, None while it is computed,
+           -1 if the strategy failed, -2 if the process has died.
+           After a failure, the process is restarted on the same board
+           up to config.AUTOPLAYER_RESTARTS times before reporting it."""
+        try:
+            if self.conn.poll():
+                res = self.conn.recv()
+            elif self.process.is_alive():
+                return None
+            else:
+                res = -2
+        except (EOFError, OSError):
+            res = -2
+        if res < 0:
+            self.cancel()
+            if self.restarts < config.AUTOPLAYER_RESTARTS:
+                self.restarts += 1
+                print("Restarting {0} player...".format(rules.PLAYER_NAME[self.player]))
+                self.play(self.board)
+                return None
+        self.restarts = 0
+        return res
+
+    def busy(self):
+        return self.process is not None and self.process.is_alive()
+
+    def cancel(self):
+        """kill the process, whatever it is doing"""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.conn.close()
+            self.process = None
+
+    def stop(self):
+        """ask the process to end, kill it if it does not"""
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(config.AUTOPLAYER_STOP_WAIT)
+        self.cancel()
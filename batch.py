@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+"""
+Batched engine for '2048': N boards stored in a (N, SIZE, SIZE) uint8 array
+(log2 values, as in rules) are moved together with NumPy.
+
+Games advance in lockstep: at each step, every unfinished game plays a
+direction and then a tile, while finished games are masked out.
+"""
+
+import time
+
+import numpy as np
+
+import rules
+import config
+import players
+
+VALS = np.array(players.VALS, dtype=np.uint8)
+
+_INDEX = {}  # permutation of rules -> (rows, cols) index arrays
+
+
+def perm_index(perm):
+    """index arrays (rows, cols) such that boards[:, rows, cols][:, i, j]
+       is the cell perm[i][j] of each board"""
+    res = _INDEX.get(perm)
+    if res is None:
+        rows = np.array([[c[0] for c in line] for line in perm])
+        cols = np.array([[c[1] for c in line] for line in perm])
+        res = _INDEX[perm] = (rows, cols)
+    return res
+
+
+def empty_boards(n, board=None):
+    """n copies of 'board' (default: the empty board)"""
+    if board is None:
+        board = rules.EMPTYBOARD
+    return np.repeat(np.array(board, dtype=np.uint8)[None], n, axis=0)
+
+
+def slide_lines(lines):
+    """LEFT slide of every line of 'lines' (array of shape (..., SIZE)),
+       with the same merges as rules.slide. Returns a new array."""
+    # tiles first, in their order, then empty cells
+    order = np.argsort(lines == 0, axis=-1, kind='stable')
+    res = np.take_along_axis(lines, order, axis=-1)
+    for case in range(rules.LAST):
+        merge = (res[..., case] != 0) & (res[..., case] == res[..., case + 1])
+        res[..., case] += merge
+        res[..., case + 1:-1] = np.where(merge[..., None],
+                                         res[..., case + 2:],
+                                         res[..., case + 1:-1])
+        res[..., -1] = np.where(merge, 0, res[..., -1])
+    return res
+
+
+def move_dir(directions, boards):
+    """Returns (res, changed) where res[k] is boards[k] slid according to
+       directions[k] (an int or an array of N directions), and changed[k]
+       tells whether boards[k] has changed. 'boards' remains unchanged."""
+    directions = np.broadcast_to(directions, boards.shape[:1])
+    res = boards.copy()
+    for d in rules.DIRECTIONS:
+        sel = np.flatnonzero(directions == d)
+        if not len(sel):
+            continue
+        rows, cols = perm_index(rules.PERM[d])
+        sub = res[sel]
+        sub[:, rows, cols] = slide_lines(sub[:, rows, cols])
+        res[sel] = sub
+    changed = (res != boards).any(axis=(1, 2))
+    return res, changed
+
+
+def move_dir_possible(boards):
+    """(N, 4) bool array: whether each direction can be played on each board"""
+    res = np.empty((len(boards), len(rules.DIRECTIONS)), dtype=bool)
+    for d in rules.DIRECTIONS:
+        rows, cols = perm_index(rules.PERM[d])
+        lines = boards[:, rows, cols]
+        cur, nxt = lines[..., :-1], lines[..., 1:]
+        res[:, d] = (((cur == 0) & (nxt != 0))
+                     | ((cur == nxt) & (cur != 0))).any(axis=(1, 2))
+    return res
+
+
+def game_over(boards):
+    """bool array: whether no direction can be played on each board"""
+    return ~move_dir_possible(boards).any(axis=1)
+
+
+def is_full(boards):
+    """bool array: whether each board has no empty cell"""
+    return (boards != 0).all(axis=(1, 2))
+
+
+def max_tile(boards):
+    """array of the max tile (log2 value) of each board"""
+    return boards.max(axis=(1, 2))
+
+
+def spawn_tiles(boards, rng, mask=None):
+    """put a random tile on a random empty cell of each board (in place),
+       with the distribution of players.random_tile.
+       Only boards selected by 'mask' and not full are changed.
+       Returns the bool array of changed boards."""
+    n, size = boards.shape[:2]
+    keys = rng.random((n, size * size))
+    keys[boards.reshape(n, size * size) != 0] = -1
+    cells = keys.argmax(axis=1)
+    sel = keys[np.arange(n), cells] >= 0
+    if mask is not None:
+        sel &= mask
+    values = VALS[rng.integers(len(VALS), size=n)]
+    boards[sel, cells[sel] // size, cells[sel] % size] = values[sel]
+    return sel
+
+
+# ---------------------------
+# direction policies: (boards, possible, rng) -> array of directions
+# where 'possible' is the result of move_dir_possible(boards)
+
+
+def random_directions(boards, possible, rng):
+    """uniform choice among possible directions, like players.random_direction"""
+    keys = rng.random(possible.shape)
+    keys[~possible] = -1
+    return keys.argmax(axis=1)
+
+
+def first_directions(boards, possible, rng):
+    """first possible direction, like players.first_direction"""
+    return possible.argmax(axis=1)
+
+
+def empty_directions(boards, possible, rng):
+    """direction leaving the most empty cells (ties broken at random)"""
+    keys = rng.random(possible.shape)
+    for d in rules.DIRECTIONS:
+        res, _ = move_dir(d, boards)
+        keys[:, d] += (res == 0).sum(axis=(1, 2))
+    keys[~possible] = -1
+    return keys.argmax(axis=1)
+
+
+def player_directions(player):
+    """policy calling a direction player of players.py on each board"""
+    def policy(boards, possible, rng):
+        return np.array([player(b.tolist()) for b in boards], dtype=np.intp)
+    return policy
+
+
+def play(n, policy=random_directions, board=None, rng=None, tile_first=True):
+    """play n games in lockstep with random tiles and 'policy' directions.
+       Returns (boards, moves) where moves counts plies as mean_score does."""
+    if rng is None:
+        rng = np.random.default_rng()
+    boards = empty_boards(n, board)
+    moves = np.zeros(n, dtype=np.int64)
+    if tile_first:
+        moves += spawn_tiles(boards, rng)
+    live = np.arange(n)
+    while True:
+        sub = boards[live]
+        possible = move_dir_possible(sub)
+        playing = possible.any(axis=1)
+        live, sub, possible = live[playing], sub[playing], possible[playing]
+        if not len(live):
+            break
+        sub, changed = move_dir(policy(sub, possible, rng), sub)
+        assert changed.all()
+        spawn_tiles(sub, rng)
+        boards[live] = sub
+        moves[live] += 1
+    return boards, moves
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    INIT_TIME = time.time()
+    boards, moves = play(config.GAMES_NUMBER)
+    scores = 1 << max_tile(boards).astype(np.int64)
+    print("TOTAL TIME:", time.time() - INIT_TIME)
+    print("MEAN MAX TILE:{0} -- MEAN TILE NUMBER: {1}".format(
+        scores.mean(), moves.mean()))
+    print("MAX of MAX TILE:{0} -- PROBA: {1}".format(
+        scores.max(), (scores == scores.max()).mean()))
+    print("MIN of MAX TILE:{0} -- PROBA: {1}".format(
+        scores.min(), (scores == scores.min()).mean()))
@@ -0,0 +1,240 @@
+#! /usr/bin/env python3
+"""
+Benchmarks of rules and players, on fixed corpora of boards.
+
+Each benchmark is run 'warmup' times, then timed 'repeat' times. Results
+are written as JSON; given a baseline (a previous JSON output), any
+benchmark whose best time is slower than the baseline's by more than the
+tolerance is reported as a regression, and the exit status is 1.
+
+    python3 benchmark.py -o bench.json
+    python3 benchmark.py --baseline bench.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import rules
+import players
+import mean_score
+
+SEED = 2048  # seed of the generated corpora and of the timed games
+CORPUS_GAMES = 20  # games played to generate the midgame and endgame boards
+GAMES = 5  # games timed for each pairing
+
+# players not timed: anytime_direction takes its time budget (config.MOVE_BUDGET),
+# ntuple_direction needs a trained weight file, remote players a running server.py
+SKIPPED = ('anytime_direction', 'ntuple_direction', 'remote_direction', 'remote_tile')
+
+# players timed on boards, but not in full games: a game takes 10 to 40 seconds
+GAMES_SKIPPED = ('montecarlo_direction',)
+
+
+# ---------------------------
+# corpora
+
+
+def random_game(rng_seed):
+    """boards of a seeded random-vs-random game, from the first tile"""
+    random.seed(rng_seed)
+    board = [line.copy() for line in rules.EMPTYBOARD]
+    rules.move_tile(players.random_tile(board), board)
+    res = [board]
+    while not rules.game_over(board):
+        board = rules.move_dir(players.random_direction(board), board)
+        rules.move_tile(players.random_tile(board), board)
+        res.append(board)
+    return res
+
+
+def corpora():
+    """name -> list of boards"""
+    midgame, endgame = [], []
+    for k in range(CORPUS_GAMES):
+        game = random_game(SEED + k)
+        midgame.append(game[len(game) // 2])
+        endgame.append(game[-2])  # last board on which a direction is possible
+    return {'predefined': [rules.STEP0, rules.XFULLBOARD, rules.FINAL1],
+            'midgame': midgame,
+            'endgame': endgame}
+
+
+# ---------------------------
+# benchmarks: name -> (function running a batch of calls, number of calls)
+
+
+def rules_benchmarks(corpus):
+    res = {}
+    for name, boards in corpus.items():
+        calls = len(boards) * len(rules.DIRECTIONS)
+
+        def move_dir(boards=boards):
+            for b in boards:
+                for d in rules.DIRECTIONS:
+                    rules.move_dir(d, b)
+
+        def move_dir_possible(boards=boards):
+            for b in boards:
+                for d in rules.DIRECTIONS:
+                    rules.move_dir_possible(d, b)
+
+        def game_over(boards=boards):
+            for b in boards:
+                rules.game_over(b)
+
+        def slide(boards=boards):
+            for b in boards:
+                for perm in rules.PERM:
+                    out = [line.copy() for line in b]
+                    for i in range(rules.SIZE):
+                        rules.slide(b, out, i, perm)
+
+        def level(boards=boards):
+            for b in boards:
+                rules.level(b)
+
+        res['rules.move_dir/' + name] = (move_dir, calls)
+        res['rules.move_dir_possible/' + name] = (move_dir_possible, calls)
+        res['rules.game_over/' + name] = (game_over, len(boards))
+        res['rules.slide/' + name] = (slide, calls * rules.SIZE)
+        res['rules.level/' + name] = (level, len(boards))
+    return res
+
+
+def player_names():
+    """names of the players of players.py"""
+    return sorted(name for name, f in vars(players).items()
+                  if callable(f) and getattr(f, '__module__', None) == 'players'
+                  and (name.endswith('_direction') or name.endswith('_tile'))
+                  and name not in SKIPPED)
+
+
+def players_benchmarks(corpus):
+    res = {}
+    for name in player_names():
+        strategy = getattr(players, name)
+        for cname, boards in corpus.items():
+            if name.endswith('_direction'):
+                boards = [b for b in boards if not rules.game_over(b)]
+            else:
+                boards = [b for b in boards if not rules.is_full(b)]
+            if not boards:
+                continue
+
+            def run(strategy=strategy, boards=boards):
+                players.coop_table().clear()  # time searches, not cache hits
+                for b in boards:
+                    strategy([line.copy() for line in b])
+            res['players.{0}/{1}'.format(name, cname)] = (run, len(boards))
+    return res
+
+
+def pairings():
+    """(tile player, direction player) of each full game benchmark"""
+    names = [name for name in player_names() if name not in GAMES_SKIPPED]
+    return [(tile, direction) for tile in names if tile.endswith('_tile')
+            for direction in names if direction.endswith('_direction')]
+
+
+def games_benchmarks():
+    res = {}
+    for tile, direction in pairings():
+        def run(tile=getattr(players, tile), direction=getattr(players, direction)):
+            random.seed(SEED)
+            for _ in range(GAMES):
+                players.new_game()
+                mean_score.game_tile_first(direction, tile, rules.EMPTYBOARD)
+        res['games.{0}+{1}'.format(tile, direction)] = (run, GAMES)
+    return res
+
+
+def benchmarks():
+    corpus = corpora()
+    res = rules_benchmarks(corpus)
+    res.update(players_benchmarks(corpus))
+    res.update(games_benchmarks())
+    return res
+
+
+# ---------------------------
+# timing and reports
+
+
+def measure(run, calls, warmup, repeat):
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) / calls)
+    return {'calls': calls,
+            'warmup': warmup,
+            'repeat': repeat,
+            'times': times,
+            'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if repeat > 1 else 0.,
+            'min': min(times)}
+
+
+def run_all(warmup, repeat, pattern=None):
+    res = {}
+    for name, (run, calls) in benchmarks().items():
+        if pattern is not None and pattern not in name:
+            continue
+        sys.stderr.write("{0}...\n".format(name))
+        res[name] = measure(run, calls, warmup, repeat)
+    return {'python': platform.python_version(),
+            'machine': platform.machine(),
+            'unit': 'seconds per call (per game for games.*)',
+            'seed': SEED,
+            'benchmarks': res}
+
+
+def regressions(results, baseline, tolerance):
+    """[(name, baseline min, min)] of the benchmarks slower than baseline"""
+    res = []
+    for name, bench in results['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is not None and bench['min'] > old['min'] * (1 + tolerance):
+            res.append((name, old['min'], bench['min']))
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', help="JSON file of the results (default: stdout)")
+    parser.add_argument('--baseline', help="JSON file of previous results to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="slowdown ratio reported as a regression (default: 0.2)")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-k', '--filter', help="only run benchmarks whose name contains FILTER")
+    args = parser.parse_args()
+
+    results = run_all(args.warmup, args.repeat, args.filter)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(results, baseline, args.tolerance)
+        for name, old, new in slower:
+            print("REGRESSION {0}: {1:.3g}s -> {2:.3g}s (x{3:.2f})".format(
+                name, old, new, new / old), file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    main()
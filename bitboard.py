@@ -0,0 +1,389 @@
+"""bitboard engine for 2048: a board packed into a single int
+
+The 16 cells are stored as nibbles (log2 values, as in rules):
+cell (i, j) is at bits 4 * (SIZE * i + j). So row i is the 16-bit integer
+(b >> 16 * i) & 0xFFFF, with its cell j in nibble j.
+
+Moves are computed with precomputed tables indexed by such a 16-bit row.
+Tiles are limited to 2 ** 15 (a nibble); merging two 2 ** 15 tiles is not
+representable and saturates at 2 ** 15.
+
+Functions with the names of rules (move_dir, move_dir_possible, game_over,
+is_full, max_tile, move_tile) work on packed ints; to_int and to_board
+convert from and to the list-of-lists boards of rules.
+"""
+
+import random
+
+import rules
+import tables
+import players
+
+SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_LOG2 = 15
+ROWS = 1 << 16  # number of possible rows
+
+
+# ---------------------------
+# conversions
+
+
+def to_int(board):
+    """pack a list-of-lists board into an int
+       raise ValueError if a tile is above 2 ** MAX_LOG2"""
+    res = 0
+    shift = 0
+    for line in board:
+        for v in line:
+            if v > MAX_LOG2:
+                raise ValueError("tile 2**{0} does not fit in a bitboard".format(v))
+            res |= v << shift
+            shift += 4
+    return res
+
+
+CELLS = tuple((i, j, 16 * i + 4 * j) for i in range(SIZE) for j in range(SIZE))
+
+
+def to_board(b):
+    """unpack an int into a new list-of-lists board"""
+    return [[(b >> (16 * i + 4 * j)) & 15 for j in range(SIZE)]
+            for i in range(SIZE)]
+
+
+def transpose(b):
+    """swap rows and columns of a packed board"""
+    a1 = b & 0xF0F00F0FF0F00F0F
+    a2 = b & 0x0000F0F00000F0F0
+    a3 = b & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(b):
+    """reverse each row of a packed board (the MIRROR permutation of rules)"""
+    return (((b & 0x000F000F000F000F) << 12) | ((b & 0x00F000F000F000F0) << 4)
+            | ((b >> 4) & 0x00F000F000F000F0) | ((b >> 12) & 0x000F000F000F000F))
+
+
+def flip(b):
+    """reverse the order of the rows of a packed board"""
+    return (((b & 0xFFFF) << 48) | ((b & 0xFFFF0000) << 16)
+            | ((b >> 16) & 0xFFFF0000) | (b >> 48))
+
+
+# ---------------------------
+# tables
+
+
+def _row_cells(r):
+    return [(r >> (4 * j)) & 15 for j in range(SIZE)]
+
+
+def _cells_row(cells):
+    res = 0
+    for j, v in enumerate(cells):
+        res |= min(v, MAX_LOG2) << (4 * j)
+    return res
+
+
+def _slide_left(r):
+    """LEFT slide of row 'r', using rules.slide_line (of any board size)"""
+    return _cells_row(rules.slide_line(_row_cells(r))[0])
+
+
+def _reverse(r):
+    return ((r & 0xF) << 12) | ((r & 0xF0) << 4) | ((r >> 4) & 0xF0) | (r >> 12)
+
+
+def _spread(r):
+    """put nibble j of row 'r' at bit 16 * j (a column of the board)"""
+    return ((r & 0xF) | ((r & 0xF0) << 12) | ((r & 0xF00) << 24)
+            | ((r & 0xF000) << 36))
+
+
+# tables of the rows, loaded by load_tables on the first move of a process
+# (a process using only the conversions and symmetries loads none):
+# LEFT and RIGHT slides of each row, and the same as columns for UP and DOWN
+ROW_LEFT = ROW_RIGHT = COL_UP = COL_DOWN = None
+# whether LEFT (RIGHT) moves each row, and for each direction the "can move"
+# table of its lines, which are columns (of the transposed board) for DOWN and UP
+CAN_LEFT = CAN_RIGHT = CAN_TABLES = None
+VERTICAL = (True, False, False, True)
+# bit d set if direction d moves a row (ROW_DIRS) or a column (COL_DIRS)
+ROW_DIRS = COL_DIRS = None
+# possible directions of each such mask, in the order of rules.DIRECTIONS
+DIRS = tuple([d for d in rules.DIRECTIONS if m >> d & 1] for m in range(16))
+# bit j set if cell j of the row is empty
+ROW_EMPTY = None
+
+
+def load_tables():
+    """set the tables above (once): built once, then read from the disk
+       cache (see tables.py)"""
+    global ROW_LEFT, ROW_RIGHT, COL_UP, COL_DOWN, CAN_LEFT, CAN_RIGHT, CAN_TABLES
+    global ROW_DIRS, COL_DIRS, ROW_EMPTY
+    if ROW_EMPTY is not None:
+        return
+    left = tables.load('row_left', 'H', lambda: (_slide_left(r) for r in range(ROWS)), SIZE)
+    right = tables.load('row_right', 'H',
+                        lambda: (_reverse(left[_reverse(r)]) for r in range(ROWS)), SIZE)
+    ROW_LEFT, ROW_RIGHT = left, right
+    COL_UP = tables.load('col_up', 'Q', lambda: map(_spread, left), SIZE)
+    COL_DOWN = tables.load('col_down', 'Q', lambda: map(_spread, right), SIZE)
+    can_left = bytes(left[r] != r for r in range(ROWS))
+    can_right = bytes(right[r] != r for r in range(ROWS))
+    CAN_LEFT, CAN_RIGHT = can_left, can_right
+    CAN_TABLES = (can_right, can_left, can_right, can_left)
+    ROW_DIRS = tables.load('row_dirs', 'B', lambda: (
+        (a << rules.LEFT) | (b << rules.RIGHT) for a, b in zip(can_left, can_right)), SIZE)
+    COL_DIRS = tables.load('col_dirs', 'B', lambda: (
+        (a << rules.UP) | (b << rules.DOWN) for a, b in zip(can_left, can_right)), SIZE)
+    ROW_EMPTY = tables.load('row_empty', 'B', lambda: (
+        sum(1 << j for j in range(SIZE) if not (r >> (4 * j)) & 15) for r in range(ROWS)), SIZE)
+
+
+_EMPTY_CELLS = {}  # empty cells (i, j) of each mask of empty_mask()
+_LAST_DIRS = [None, DIRS[0]]  # last board of possible_directions and its result
+
+
+# ---------------------------
+# rules on packed ints
+
+
+def move_tile(new_tile_move, b):
+    """return 'b' with the new tile (i, j, log2_value) set on it"""
+    i, j, log2_value = new_tile_move
+    shift = 16 * i + 4 * j
+    if not ((log2_value == 1 or log2_value == 2) and (b >> shift) & 15 == 0):
+        raise AssertionError
+    return b | (log2_value << shift)
+
+
+def is_full(b):
+    """test whether the board has no empty cell"""
+    x = b | (b >> 1)
+    x |= x >> 2
+    return x & 0x1111111111111111 == 0x1111111111111111
+
+
+def count_empty(b):
+    """number of empty cells of the board"""
+    x = b | (b >> 1)
+    x |= x >> 2
+    return 16 - bin(x & 0x1111111111111111).count('1')
+
+
+def empty_mask(b):
+    """16-bit mask of the empty cells: bit SIZE * i + j for cell (i, j)"""
+    if ROW_EMPTY is None:
+        load_tables()
+    return (ROW_EMPTY[b & ROW_MASK] | (ROW_EMPTY[(b >> 16) & ROW_MASK] << 4)
+            | (ROW_EMPTY[(b >> 32) & ROW_MASK] << 8) | (ROW_EMPTY[b >> 48] << 12))
+
+
+def empty_cells(b):
+    """list of the empty cells (i, j) of the board (not to be changed)"""
+    m = empty_mask(b)
+    res = _EMPTY_CELLS.get(m)
+    if res is None:
+        res = _EMPTY_CELLS[m] = [(i, j) for i, j, shift in CELLS
+                                 if m >> (shift // 4) & 1]
+    return res
+
+
+def max_tile(b):
+    """return the max tile on the board."""
+    res = 0
+    while b:
+        v = b & 15
+        if v > res:
+            res = v
+        b >>= 4
+    return res
+
+
+def move_dir(direction, b):
+    """Returns the board resulting from the slide of 'b'
+       according to 'direction'. The result is equal to 'b' iff
+       'direction' does not change the board.
+    """
+    if ROW_EMPTY is None:
+        load_tables()
+    if direction == rules.LEFT:
+        return (ROW_LEFT[b & ROW_MASK]
+                | (ROW_LEFT[(b >> 16) & ROW_MASK] << 16)
+                | (ROW_LEFT[(b >> 32) & ROW_MASK] << 32)
+                | (ROW_LEFT[b >> 48] << 48))
+    if direction == rules.RIGHT:
+        return (ROW_RIGHT[b & ROW_MASK]
+                | (ROW_RIGHT[(b >> 16) & ROW_MASK] << 16)
+                | (ROW_RIGHT[(b >> 32) & ROW_MASK] << 32)
+                | (ROW_RIGHT[b >> 48] << 48))
+    table = COL_UP if direction == rules.UP else COL_DOWN
+    t = transpose(b)
+    return (table[t & ROW_MASK]
+            | (table[(t >> 16) & ROW_MASK] << 4)
+            | (table[(t >> 32) & ROW_MASK] << 8)
+            | (table[t >> 48] << 12))
+
+
+def move_dir_possible(direction, b):
+    """test whether a move_dir applied on board is possible."""
+    if ROW_EMPTY is None:
+        load_tables()
+    if VERTICAL[direction]:
+        b = transpose(b)
+    can = CAN_TABLES[direction]
+    return bool(can[b & ROW_MASK] or can[(b >> 16) & ROW_MASK]
+                or can[(b >> 32) & ROW_MASK] or can[b >> 48])
+
+
+def possible_directions(b):
+    """list of the directions changing the board (not to be changed),
+       in the order of rules.DIRECTIONS"""
+    if b == _LAST_DIRS[0]:  # game_over, then the direction player
+        return _LAST_DIRS[1]
+    if ROW_EMPTY is None:
+        load_tables()
+    t = transpose(b)
+    res = DIRS[ROW_DIRS[b & ROW_MASK] | ROW_DIRS[(b >> 16) & ROW_MASK]
+               | ROW_DIRS[(b >> 32) & ROW_MASK] | ROW_DIRS[b >> 48]
+               | COL_DIRS[t & ROW_MASK] | COL_DIRS[(t >> 16) & ROW_MASK]
+               | COL_DIRS[(t >> 32) & ROW_MASK] | COL_DIRS[t >> 48]]
+    _LAST_DIRS[0], _LAST_DIRS[1] = b, res
+    return res
+
+
+def game_over(b):
+    """check if no direction can be played"""
+    return not possible_directions(b)
+
+
+# ---------------------------
+# players on packed ints
+# They draw the same random numbers as their namesakes in players,
+# so that a seeded game is the same on both engines.
+
+
+def random_direction(b):
+    l = possible_directions(b)
+    if l:
+        return random.choice(l)
+
+
+def random_tile(b):
+    possible = empty_cells(b)
+    if possible:
+        coup = random.choice(players.VALS)
+        case = random.choice(possible)
+        return (case[0], case[1], coup)
+
+
+def first_direction(b):
+    l = possible_directions(b)
+    if l:
+        return l[0]
+
+
+def first_tile(b):
+    for i, j, shift in reversed(CELLS):
+        if not (b >> shift) & 15:
+            return (i, j, 2)
+
+
+# ---------------------------
+# games of the players above
+
+
+LOOP_PLAYERS = (random_direction, first_direction, random_tile, first_tile)
+
+
+def play(direction, tile, b):
+    """(max tile, number of moves) of the game of 'b', DIRECTION to play,
+       between 'direction' and 'tile' of LOOP_PLAYERS. Same game as the
+       loop of mean_score.bitboard_direction_first, but in a single loop:
+       moves are inlined, and random draws are made as random.choice does
+       (seq[randbelow(len(seq))], by getrandbits) to avoid calls per move."""
+    load_tables()
+    row_left, row_right, col_up, col_down = ROW_LEFT, ROW_RIGHT, COL_UP, COL_DOWN
+    row_dirs, col_dirs, dirs, mask = ROW_DIRS, COL_DIRS, DIRS, ROW_MASK
+    row_empty, cells = ROW_EMPTY, _EMPTY_CELLS
+    left, right, up = rules.LEFT, rules.RIGHT, rules.UP
+    getrandbits = random.getrandbits
+    vals = players.VALS
+    nvals = len(vals)
+    kvals = nvals.bit_length()
+    random_dir = direction is random_direction
+    random_cell = tile is random_tile
+    i = 0
+    while True:
+        t = b & 0xF0F00F0FF0F00F0F | (b & 0x0000F0F00000F0F0) << 12 \
+            | (b & 0x0F0F00000F0F0000) >> 12  # transpose(b)
+        t = t & 0xFF00FF0000FF00FF | (t & 0x00FF00FF00000000) >> 24 \
+            | (t & 0x00000000FF00FF00) << 24
+        l = dirs[row_dirs[b & mask] | row_dirs[(b >> 16) & mask]
+                 | row_dirs[(b >> 32) & mask] | row_dirs[b >> 48]
+                 | col_dirs[t & mask] | col_dirs[(t >> 16) & mask]
+                 | col_dirs[(t >> 32) & mask] | col_dirs[t >> 48]]
+        if not l:
+            break
+        if random_dir:
+            n = len(l)
+            k = n.bit_length()
+            r = getrandbits(k)
+            while r >= n:
+                r = getrandbits(k)
+            d = l[r]
+        else:
+            d = l[0]
+        if d == left:
+            b = (row_left[b & mask] | (row_left[(b >> 16) & mask] << 16)
+                 | (row_left[(b >> 32) & mask] << 32) | (row_left[b >> 48] << 48))
+        elif d == right:
+            b = (row_right[b & mask] | (row_right[(b >> 16) & mask] << 16)
+                 | (row_right[(b >> 32) & mask] << 32) | (row_right[b >> 48] << 48))
+        else:  # from the transposed board above
+            table = col_up if d == up else col_down
+            b = (table[t & mask] | (table[(t >> 16) & mask] << 4)
+                 | (table[(t >> 32) & mask] << 8) | (table[t >> 48] << 12))
+        possible = cells.get(row_empty[b & mask] | (row_empty[(b >> 16) & mask] << 4)
+                             | (row_empty[(b >> 32) & mask] << 8)
+                             | (row_empty[b >> 48] << 12))
+        if possible is None:
+            possible = empty_cells(b)  # not empty after a move
+        if random_cell:
+            r = getrandbits(kvals)
+            while r >= nvals:
+                r = getrandbits(kvals)
+            coup = vals[r]
+            n = len(possible)
+            k = n.bit_length()
+            r = getrandbits(k)
+            while r >= n:
+                r = getrandbits(k)
+            x, y = possible[r]
+        else:
+            coup = 2
+            x, y = possible[-1]
+        b |= coup << (16 * x + 4 * y)
+        i += 1
+    return (1 << max_tile(b), i)
+
+
+# ---------------------------
+# adapters of players.py
+
+
+def native(player):
+    """return a version of 'player' working on packed ints:
+       its namesake above if any, else 'player' on unpacked boards."""
+    if getattr(player, '__module__', None) == 'players':
+        res = globals().get(player.__name__)
+        if res is not None:
+            return res
+    return lambda b: player(to_board(b))
@@ -0,0 +1,104 @@
+"""Command line options of play2048 and mean_score
+
+Options override the values of config.py. Players are given by their name
+in players.py, or as module.name (or module:name) for a player of another
+module, and are only imported when the run starts: config.py holds these
+names, so that importing it imports no player module.
+"""
+
+import argparse
+import importlib
+import json
+
+import rules
+import config
+
+
+def resolve(spec):
+    """player from its name in players.py, or from module.name / module:name"""
+    if ':' in spec:
+        module, name = spec.split(':')
+    elif '.' in spec:
+        module, name = spec.rsplit('.', 1)
+    else:
+        module, name = 'players', spec
+    return getattr(importlib.import_module(module), name)
+
+
+def player(spec):
+    """player of config: None (interactive), a function, or a name to resolve"""
+    if spec is None or callable(spec):
+        return spec
+    return resolve(spec)
+
+
+def name(player):
+    """name of a player of config, as resolve takes it (None if interactive)"""
+    if player is None or isinstance(player, str):
+        return player
+    if player.__module__ == 'players':
+        return player.__name__
+    return player.__module__ + ':' + player.__qualname__
+
+
+def load_players():
+    """replace the player names of config by the players themselves"""
+    config.TILE_PLAYER = player(config.TILE_PLAYER)
+    config.DIRECTION_PLAYER = player(config.DIRECTION_PLAYER)
+    config.BASELINE = player(config.BASELINE)
+
+
+def board(text):
+    """board of a name of rules (such as EMPTYBOARD or STEP0), or of its JSON"""
+    if hasattr(rules, text) and isinstance(getattr(rules, text), list):
+        return getattr(rules, text)
+    try:
+        res = json.loads(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("not a board name of rules nor a JSON board")
+    if not (isinstance(res, list) and all(isinstance(line, list) and len(line) == len(res)
+                                          for line in res)):
+        raise argparse.ArgumentTypeError("a board is a JSON list of lists of log2 values")
+    return res
+
+
+def parser(description, gui=False):
+    """parser of the options of mean_score, or of play2048 if 'gui'"""
+    res = argparse.ArgumentParser(description=description)
+    more = " ('human' for an interactive player)" if gui else ""
+    res.add_argument('-t', '--tile',
+                     help="tile player: name in players.py or module.name" + more)
+    res.add_argument('-d', '--direction',
+                     help="direction player: name in players.py or module.name" + more)
+    res.add_argument('--depth', type=int, help="plies searched by the coop players")
+    res.add_argument('-b', '--board', type=board,
+                     help="initial board: name in rules.py (EMPTYBOARD, STEP0...) or JSON")
+    res.add_argument('--size', type=int, help="size of the boards")
+    res.add_argument('--first', type=int, choices=(0, 1),
+                     help="first player: 0 for TILE, 1 for DIRECTION")
+    res.add_argument('--seed', type=int, help="seed of the run")
+    if not gui:
+        res.add_argument('-n', '--games', type=int, help="number of games")
+        res.add_argument('--workers', type=int,
+                         help="processes playing the games (0 for one per core)")
+        res.add_argument('--baseline', help="direction player replaying each game")
+        res.add_argument('--results', help="log of the finished games, to resume a run")
+        res.add_argument('--bitboard', action='store_true', default=None,
+                         help="play the games on packed int boards (see bitboard.py)")
+    return res
+
+
+# option -> name in config
+OPTIONS = {'tile': 'TILE_PLAYER', 'direction': 'DIRECTION_PLAYER', 'depth': 'DEPTH',
+           'board': 'INIT_BOARD', 'size': 'BOARD_SIZE', 'first': 'FIRST_PLAYER',
+           'seed': 'SEED', 'games': 'GAMES_NUMBER', 'workers': 'WORKERS',
+           'baseline': 'BASELINE', 'results': 'RESULTS', 'bitboard': 'BITBOARD'}
+
+
+def configure(args):
+    """set in config the options given in 'args' (parsed by parser())"""
+    for option, value in vars(args).items():
+        if option in OPTIONS and value is not None:
+            if value == 'human' and option in ('tile', 'direction'):
+                value = None  # interactive player of play2048
+            setattr(config, OPTIONS[option], value)
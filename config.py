@@ -1,12 +1,29 @@
-"""Configutation file for play2048 and mean_score"""
+"""Configutation file for play2048 and mean_score
+
+Players are given by their name in players.py, or as module.name for a
+player of another module (see cli.py): they are imported when a run starts.
+"""
 
 import rules
-import players
 
-DEPTH = 3
+DEPTH = 3  # plies searched by coop players (a ply is a direction or a tile)
+TILE_BEAM = 4  # beam width: tile placements of best static value searched at
+               # each tile ply, a heuristic pruning (None searches them all)
+MAX_DEPTH = 12  # deepest search of anytime_direction
+MOVE_BUDGET = 100  # milliseconds per move of anytime_direction (None: WAIT_DURATION)
+SEARCH_REPORT = False  # True prints the depth and nodes of each anytime search
+ROLLOUTS = 20  # random playouts per direction of montecarlo_direction
+ROLLOUT_DEPTH = 10  # directions played by a playout (None: until game over)
+ROLLOUT_BUDGET = None  # or milliseconds per move: playouts go on until spent
+ROLLOUT_BATCH = 5  # playouts per task of the process pool
+ROLLOUT_WORKERS = 1  # processes of montecarlo_direction (0 for one per core)
+TT_SIZE = 200000  # max entries of the transposition table (about 200 bytes each)
+TT_POLICY = 'depth'  # or 'lru': eviction policy of the transposition table
+NTUPLE_WEIGHTS = "ntuple.npy"  # weight file of ntuple_direction (see ntuple.py)
 
 # --- INITIAL BOARD ----------
-INIT_BOARD = rules.EMPTYBOARD
+BOARD_SIZE = 4  # boards of BOARD_SIZE x BOARD_SIZE (see rules.set_size)
+INIT_BOARD = rules.EMPTYBOARD  # the empty board of BOARD_SIZE, whatever it is
 # INIT_BOARD = rules.STEP0
 # INIT_BOARD = rules.XFULLBOARD
 # INIT_BOARD = [[0, 0, 0, 2], [0, 0, 0, 3], [0, 0, 3, 5], [12, 11, 9, 6]]
@@ -18,25 +35,47 @@ FIRST_PLAYER = 0  # for PLAYER TILE
 
 # --- TILE PLAYER ----------------------
 # TILE_PLAYER = None # means interactive (for play2048 only)
-TILE_PLAYER = players.random_tile
-#TILE_PLAYER = players.first_tile
-#TILE_PLAYER = players.basic_coop_tile
-#TILE_PLAYER = players.coop_tile
+TILE_PLAYER = 'random_tile'
+#TILE_PLAYER = 'first_tile'
+#TILE_PLAYER = 'basic_coop_tile'
+#TILE_PLAYER = 'coop_tile'
 
 
 # --- DIRECTION PLAYER -----------------
 #DIRECTION_PLAYER = None # means interactive (for play2048 only)
-#DIRECTION_PLAYER = players.random_direction
-#DIRECTION_PLAYER = players.first_direction
-DIRECTION_PLAYER = players.basic_coop_direction
-#DIRECTION_PLAYER = players.coop_direction
+#DIRECTION_PLAYER = 'random_direction'
+#DIRECTION_PLAYER = 'first_direction'
+DIRECTION_PLAYER = 'basic_coop_direction'
+#DIRECTION_PLAYER = 'coop_direction'
+#DIRECTION_PLAYER = 'anytime_direction'
+#DIRECTION_PLAYER = 'montecarlo_direction'
+#DIRECTION_PLAYER = 'ntuple_direction'
+#DIRECTION_PLAYER = 'remote_direction'  # asks server.py
+
+# --- ENGINE (for mean_score only) ----
+BITBOARD = False  # True plays games on packed int boards (see bitboard.py)
 
 # --- OBSERVER (to debug player2048) -------
 OBSERVER = None  # for nothing
 # OBSERVER = rules.observer_example
 
+# --- INSTRUMENTATION (see instrument.py) -------
+INSTRUMENT = None  # or True: report latencies of rules, players and turns
+# INSTRUMENT = "instrument.json"  # also dump the report in this JSON file
+
+# --- GAME RECORDS (see trajectory.py) -------
+RECORD = None  # or a file path: every game is appended to this record file
+RECORD_COMPRESS = 6  # zlib level of a new record file (0 for none)
+
+# --- DECISION SERVER (see server.py) -------
+SERVER_ADDRESS = ("127.0.0.1", 20480)  # of the server of remote_direction/remote_tile
+SERVER_MAX_BATCH = 64  # most boards evaluated at once
+SERVER_MAX_WAIT = 2  # milliseconds waited for a batch to fill after its first board
+
 # --- GUI DETAILS (for play2048 only) ------------------
 WAIT_DURATION = 0  # 1000 # 50 # 1000 # time in miliseconds between players
+AUTOPLAYER_RESTARTS = 1  # restarts of a failed automatic player before giving up
+AUTOPLAYER_STOP_WAIT = 1  # seconds given to an automatic player to stop
 
 TILE_SIZE = 140  # pixels
 TILE_SEP = 5  # pixels
@@ -47,4 +86,19 @@ FONT_HELP = "Helvetica 16"
 
 
 # --- NUMBER of GAMES (for mean_score only) -----------------
-GAMES_NUMBER = 100  # 5 # 1000
\ No newline at end of file
+GAMES_NUMBER = 100  # 5 # 1000
+
+# --- PARALLEL RUNS (for mean_score only) -----------------
+SEED = None  # master seed of the run (None for an unseeded run)
+WORKERS = 1  # number of processes playing the games (0 for one per core)
+CHUNK_SIZE = 1  # number of games sent at once to a worker
+PROGRESS_PERIOD = 1  # seconds between two progress reports of the workers
+RESULTS = None  # or a file path: log of the finished games, to resume a run
+
+# --- STATISTICS (for mean_score only, see stats.py) -----------------
+CONFIDENCE = 0.95  # level of the confidence intervals
+STOP_METRIC = 'max_tile'  # or 'moves' or 'p2048': metric of the early stop
+STOP_WIDTH = None  # stop once the interval of STOP_METRIC is narrower than this
+BASELINE = None  # direction player replaying each game, to compare with
+# BASELINE = 'basic_coop_direction'  # stop once the difference is significant
+MIN_GAMES = 30  # games played before any early stop
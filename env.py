@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+"""Headless step-wise environment of 2048, in the style of gym
+
+The agent plays the directions, the environment plays the tiles:
+
+    env = Env()
+    obs, info = env.reset(seed=0)
+    while True:
+        direction = agent(obs, info['legal'])
+        obs, reward, done, info = env.step(direction)
+        if done:
+            break
+
+The reward of a step is its merge score: the sum of the tiles made by
+merges (see rules.slide). Observations are the log2 boards of rules, in
+a (SIZE, SIZE) uint8 array which is the same buffer at every step: copy
+it to keep it. The same holds for info and its 'legal' mask.
+"""
+
+import random
+import time
+
+import numpy as np
+
+import rules
+import config
+import players
+
+
+class Env:
+
+    def __init__(self, tile_player=None, board=None, tile_first=True,
+                 obs=None, legal=None):
+        """'tile_player' plays the tiles, by default like players.random_tile
+           with the random generator of the environment.
+           Games start from 'board' (default: the empty board),
+           on which a tile is first played if 'tile_first'.
+           'obs' and 'legal' are optional buffers for the observation
+           and the legal mask (see vecenv.py)."""
+        self.tile_player = tile_player
+        self.init_board = rules.EMPTYBOARD if board is None else board
+        self.tile_first = tile_first
+        self.rng = random.Random()
+        self.board = None
+        self.done = True
+        self.gain = [0]
+        if obs is None:
+            obs = np.zeros((rules.SIZE, rules.SIZE), dtype=np.uint8)
+        if legal is None:
+            legal = np.zeros(len(rules.DIRECTIONS), dtype=bool)
+        self.obs = obs
+        self.legal = legal
+        self.info = {'legal': self.legal, 'score': 0, 'moves': 0, 'max_tile': 0}
+
+    def random_tile(self, board):
+        """same draws as players.random_tile, from the generator of the env"""
+        possible = [(i, j) for i in range(rules.SIZE) for j in range(rules.SIZE)
+                    if board[i][j] == 0]
+        if possible:
+            coup = self.rng.choice(players.VALS)
+            case = self.rng.choice(possible)
+            return (case[0], case[1], coup)
+
+    def play_tile(self):
+        player = self.tile_player or self.random_tile
+        tile = player(self.board)
+        if tile is not None:
+            rules.move_tile(tile, self.board)
+
+    def observe(self):
+        """update the observation buffers from the board, and return done"""
+        board = self.board
+        self.obs[:] = board
+        legal = self.legal
+        for d in rules.DIRECTIONS:
+            legal[d] = rules.move_dir_possible(d, board)
+        info = self.info
+        info['max_tile'] = rules.max_tile(board)
+        return not legal.any()
+
+    def reset(self, seed=None):
+        """start a new game. Returns (observation, info)"""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.board = [line.copy() for line in self.init_board]
+        info = self.info
+        info['score'] = 0
+        info['moves'] = 0
+        if self.tile_first:
+            self.play_tile()
+        self.done = self.observe()
+        return self.obs, info
+
+    def step(self, direction):
+        """play 'direction' then a tile.
+           Returns (observation, reward, done, info).
+           An illegal direction leaves the game unchanged, for no reward."""
+        assert self.board is not None, "reset() must be called first"
+        if self.done or not self.legal[direction]:
+            return self.obs, 0, self.done, self.info
+        gain = self.gain
+        gain[0] = 0
+        self.board = rules.move_dir(direction, self.board, gain)
+        self.play_tile()
+        self.done = self.observe()
+        info = self.info
+        info['score'] += gain[0]
+        info['moves'] += 1
+        return self.obs, gain[0], self.done, info
+
+    def legal_actions(self):
+        """mask of the directions which can be played (the info['legal'] buffer)"""
+        return self.legal
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    env = Env()
+    INIT_TIME = time.time()
+    steps = 0
+    scores = []
+    for k in range(config.GAMES_NUMBER):
+        obs, info = env.reset(seed=k)
+        done = False
+        while not done:
+            direction = env.rng.choice(np.flatnonzero(info['legal']))
+            obs, reward, done, info = env.step(direction)
+            steps += 1
+        scores.append(info['score'])
+    elapsed = time.time() - INIT_TIME
+    print("TOTAL TIME:", elapsed, "-- STEPS PER SECOND:", steps / elapsed)
+    print("MEAN MERGE SCORE:", sum(scores) / len(scores))
@@ -0,0 +1,528 @@
+"""
+Graphic User Interface to play to '2048', started by play2048.py
+once config is set: importing it opens the window.
+"""
+
+
+# --- imports ---------------------------------------------------
+
+#
+import sys
+import tkinter
+import traceback
+from collections import defaultdict
+
+import rules
+import config
+import cli
+
+# NB: automatic strategies are run into separate processes, one per player
+# (see autoplayer.py), which do not import this module.
+from autoplayer import AutoPlayer
+
+
+# --- constants --------------------------------------------------
+# colors from http://gabrielecirulli.github.io/2048/style/main.css
+COLORS = defaultdict(
+    lambda: ("#3c3a32", "#f9f6f2"), {
+        0: ("#ccc0b4", "#776e65"),
+        2: ("#eee4da", "#776e65"),
+        4: ("#ede0c8", "#776e65"),
+        8: ("#f2b179", "#f9f6f2"),
+        16: ("#f59563", "#f9f6f2"),
+        32: ("#f67c5f", "#f9f6f2"),
+        64: ("#f65e3b", "#f9f6f2"),
+        128: ("#edcf72", "#f9f6f2"),
+        256: ("#edcc61", "#f9f6f2"),
+        512: ("#edc850", "#f9f6f2"),
+        1024: ("#edc53f", "#f9f6f2"),
+        2048: ("#edc22e", "#f9f6f2"),
+    })
+
+FONT = "Helvetica 55 bold"
+FONT1 = "Helvetica 44 bold"
+FONT2 = "Helvetica 32 bold"
+FONT3 = "Helvetica 26 bold"
+
+# building the window
+
+BACKGROUND_COLOR = "#bbada0"
+
+
+PLAYERS = tuple(range(3))
+PLAY_TILE, PLAY_DIR, GAME_OVER = PLAYERS
+PLAYER_NAME = rules.PLAYER_NAME + ("GAME OVER",)
+RUN_PLAYER = None  # (tile player, direction player), loaded by start()
+IS_OVER = rules.is_full, rules.game_over
+player = config.FIRST_PLAYER
+
+# windows
+window = tkinter.Tk()
+helper = None
+askplayer_helper = False
+
+
+autoplayer = None     # AutoPlayer currently playing
+autoplayers = {}      # AutoPlayer of each automatic player
+
+board = config.INIT_BOARD
+tiles = None  # grid window of the tiles
+num_tiles = 0
+recorder = None  # instrument.Recorder when config.INSTRUMENT
+game_log = None  # trajectory.GameLog when config.RECORD
+
+# 1 millisecond is the minimum
+config.WAIT_DURATION = max(1, config.WAIT_DURATION)
+
+
+# ---------------------------
+#  Windows and their contents
+
+
+def close_on_error():
+    """display the current error trace on console and exit"""
+    traceback.print_exc()
+    sys.stderr.flush()
+    close()
+
+
+def update_helper(info, askplayer=False):
+    """Default helper with a pop-up"""
+    global helper, askplayer_helper
+    if helper is not None:
+        helper.destroy()
+    askplayer_helper = askplayer
+    helper = tkinter.Toplevel(window)
+    helper.title("play2048 help")
+    helper.protocol("WM_DELETE_WINDOW", destroy_helper)
+    helper.configure(bg="#f9f6f2")
+    msg = tkinter.Message(helper,
+                          text=info,
+                          font=config.FONT_HELP,
+                          bg="#f9f6f2",
+                          aspect=500
+                          )
+    msg.pack()
+
+
+def destroy_helper():
+    global helper, askplayer_helper
+    if helper is None:
+        return
+    helper.destroy()
+    helper = None
+    askplayer_helper = False
+
+
+def update_helper_console(info, askplayer=False):
+    """Alternative help, using console instead of a pop-up"""
+    global askplayer_helper
+    askplayer_helper = askplayer
+    print()
+    print(info)
+    sys.stdout.flush()
+
+
+def start():
+    global tiles, player, board, update_helper, recorder, game_log, IS_OVER, RUN_PLAYER
+    assert player == PLAY_TILE or player == PLAY_DIR
+    cli.load_players()
+    RUN_PLAYER = config.TILE_PLAYER, config.DIRECTION_PLAYER
+    rules.set_size(config.BOARD_SIZE)
+    IS_OVER = rules.is_full, rules.game_over
+    board = rules.start_board(board)
+    if config.INSTRUMENT:
+        # players run in their own processes: only turns and rules are timed
+        import instrument
+        recorder = instrument.enable(wrap_players=False)
+        recorder.game_start()
+    if config.RECORD:
+        import trajectory
+        assert rules.SIZE == 4  # NB: game records are of 4x4 boards only
+        game_log = trajectory.GameLog()
+    window.configure(bg=BACKGROUND_COLOR, border=config.TILE_SEP)
+    window.resizable(0, 0)
+    window.protocol("WM_DELETE_WINDOW", close)
+    tiles = [[Tile(i, j) for j in range(rules.SIZE)]
+             for i in range(rules.SIZE)]
+    update()
+    if config.DIRECTION_PLAYER is None or config.TILE_PLAYER is None:
+        window.bind_all("<ButtonPress-1>", button1_press)
+        window.bind_all("<ButtonRelease-1>", button1_release)
+        if config.DIRECTION_PLAYER is None:
+            window.bind_all("<Left>", key_press(rules.LEFT))
+            window.bind_all("<Right>", key_press(rules.RIGHT))
+            window.bind_all("<Up>", key_press(rules.UP))
+            window.bind_all("<Down>", key_press(rules.DOWN))
+    if config.HELP_ON_CONSOLE:
+        update_helper = update_helper_console
+    if board == rules.EMPTYBOARD:
+        if player == PLAY_DIR:
+            update_helper(
+                "Config error: DIRECTION cannot be first player on empty board.")
+        player = PLAY_TILE
+    elif IS_OVER[player](board):
+        player = GAME_OVER
+    run_next_player()
+    window.mainloop()
+
+
+class MyLabel(tkinter.Label):
+
+    def __init__(self, tile):
+        super().__init__(tile, font=FONT)
+        self.tile = tile
+        self.place(anchor="c", relx=.5, rely=.52)
+
+    def coord(self):
+        return self.tile.coord()
+
+
+class Tile(tkinter.Frame):
+    """Class of tiles widget on the grid """
+
+    def __init__(self, i, j):
+        super().__init__(window,
+                         width=config.TILE_SIZE,
+                         height=config.TILE_SIZE)
+        self.grid(row=i, column=j,
+                  padx=config.TILE_SEP,
+                  pady=config.TILE_SEP)
+        self.label = MyLabel(self)
+        self.i = i
+        self.j = j
+
+    def update_from_board(self):
+        v = board[self.i][self.j]
+        if v != 0:
+            v = 1 << v
+        if player == GAME_OVER:
+            fg, bg = COLORS[v]
+        else:
+            bg, fg = COLORS[v]
+        self.label.configure(bg=bg, fg=fg,
+                             text=str(v) if v else "",
+                             font=get_font(v))
+        self.configure(bg=bg)
+
+    def coord(self):
+        return (self.i, self.j)
+
+
+def get_font(v):
+    """font of tile with value v"""
+    if v < 100:
+        return FONT
+    elif v < 1000:
+        return FONT1
+    elif v < 100000:
+        return FONT2
+    else:
+        return FONT3
+
+
+def update():
+    """Update the display from the current board"""
+    for r in tiles:
+        for t in r:
+            t.update_from_board()
+
+
+# ---------------------------
+# automatic players
+
+def stop_autoplayers():
+    global autoplayer
+    autoplayer = None
+    for p in autoplayers.values():
+        p.stop()
+    autoplayers.clear()
+
+
+def move_autoplay_dir(d):
+    """move direction according to the value d of the autoplayer"""
+    if d < 0:
+        if d == -1:
+            update_helper("Direction player failed !\n" +
+                          "See error trace on console\n")
+        else:
+            update_helper("Automatic player has been interrupted !\n")
+        close_on_error()
+        return
+    try:
+        move_dir(d)
+    except:
+        close_on_error()
+
+
+def move_autoplay_tile(r):
+    """move tile according to the value r of the autoplayer"""
+    if r < 0:
+        if r == -1:
+            update_helper("Tile player failed !\n" +
+                          "See error trace on console\n")
+        else:
+            update_helper("Automatic player has been interrupted !\n")
+        close_on_error()
+        return
+    i = r // (2 * rules.SIZE)
+    j = (r // 2) % rules.SIZE
+    k = (r % 2) + 1
+    try:
+        move_tile((i, j, k))
+    except:
+        close_on_error()
+
+
+MOVE = move_autoplay_tile, move_autoplay_dir
+
+# time in microsecond to check autoplayer process
+AUTOPLAYER_REACT = min(config.WAIT_DURATION, 50)
+
+
+def wait_autoplayer():
+    """Check the activity of autoplayer process, and update GUI accordingly"""
+    global autoplayer
+    if autoplayer is None:
+        return
+    res = autoplayer.result()
+    if res is None:
+        window.after(AUTOPLAYER_REACT, wait_autoplayer)
+        return
+    autoplayer = None
+    MOVE[player](res)
+
+
+def start_autoplayer():
+    """Send the board to the autoplayer process, and wait it !"""
+    global autoplayer
+    assert autoplayer is None
+    strategy = RUN_PLAYER[player]
+    assert strategy is not None
+    if player not in autoplayers:
+        autoplayers[player] = AutoPlayer(player, strategy)
+    autoplayer = autoplayers[player]
+    autoplayer.play(board)
+    window.after(config.WAIT_DURATION, wait_autoplayer)
+
+
+def save_game_log():
+    """append the game played so far to the record file config.RECORD"""
+    global game_log
+    import trajectory
+    with trajectory.Writer(config.RECORD, config.RECORD_COMPRESS) as writer:
+        game_log.game_id = len(writer)
+        writer.add(game_log)
+    game_log = None
+
+
+def close():
+    """close the window, stopping the autoplayer processes"""
+    if game_log is not None:
+        save_game_log()
+    stop_autoplayers()
+    window.destroy()
+
+
+# -------------------------------
+# handling button and key events
+
+
+# state variable indicating whether the user is expected to emit some event
+# invariant:
+#  is_interactive <=> (player != GAME_OVER and RUN_PLAYER[player] is None)
+is_interactive = False
+
+
+def interactive():
+    global is_interactive
+    sys.stdout.flush()
+    is_interactive = True
+
+
+def uninteractive():
+    global is_interactive
+    sys.stdout.flush()
+    is_interactive = False
+
+
+HELP_TILE = \
+    "TO PLAY A TILE: first touch an empty tile on the board, then move LEFT for a 2, or move RIGHT for a 4 (while still touching the board)."
+
+HELP_DIRECTION = \
+    "TO PLAY A DIRECTION: move DOWN or LEFT or UP or RIGHT, while touching the board."
+
+HELP_INTERACTIVE = HELP_TILE, HELP_DIRECTION
+
+
+def help_interactive(error=None):
+    if error is not None:
+        msg = "ERROR: " + error + "!\n"
+    else:
+        msg = ""
+    update_helper(msg + HELP_INTERACTIVE[player])
+
+
+def help_noninteractive():
+    global autoplayer_helper
+    if player == GAME_OVER:
+        update_helper("The game is over. The max tile is {0}. You can safely close the board...".format(
+            rules.score(board)))
+        return
+    if autoplayer is not None and autoplayer.busy():
+        update_helper("Current player {0} is a bit slow to play... Please wait !".format(
+            PLAYER_NAME[player]), True)
+
+
+def key_press(direction):
+    def callback(event):
+        destroy_helper()
+        if not is_interactive:
+            help_noninteractive()
+            return
+        if player == PLAY_TILE:
+            update_helper(
+                "ERROR: you cannot play a tile on keyboard!\n" + HELP_TILE)
+            return
+        assert player == PLAY_DIR
+        move_dir(direction)
+    return callback
+
+
+press_tile, press_x, press_y = None, None, None
+
+
+def button1_press(event):
+    global press_tile, press_x, press_y
+    destroy_helper()
+    if not is_interactive:
+        return  # help given on button release, below !
+    press_tile = event.widget
+    press_x = event.x
+    press_y = event.y
+
+
+def move_tile_from_direction(direction):
+    "move tile according to a direction on a button release (see below)."
+    if type(press_tile) is not Tile:
+        help_interactive("You have not touched a tile of the board")
+        return  # invalid move !
+    (i, j) = press_tile.coord()  # press_tile from button1_press
+    if board[i][j] != 0:
+        help_interactive("Tile {0} is not empty".format((i, j)))
+        return
+    if direction != rules.LEFT and direction != rules.RIGHT:
+        help_interactive("Cannot  dectect a LEFT or RIGHT move")
+        return
+    # We have now a valid move !
+    if direction == rules.LEFT:
+        value = 1
+    else:
+        value = 2
+    move_tile((i, j, value))
+
+
+def button1_release(event):
+    global press_x, press_y
+    if not is_interactive:
+        help_noninteractive()
+        return
+    try:
+        delta_x = event.x - press_x
+        delta_y = event.y - press_y
+    except:
+        help_interactive("Cannot detect a valid move")
+        return
+    d = abs(delta_x) - abs(delta_y)
+    press_x, press_y = None, None
+    if abs(d) <= config.SENSITIVE:
+        help_interactive("Cannot detect a valid move")
+        return
+    if d > 0:
+        if delta_x > 0:
+            direction = rules.RIGHT
+        else:
+            assert delta_x < 0
+            direction = rules.LEFT
+    elif delta_y > 0:
+        direction = rules.DOWN
+    else:
+        assert delta_y < 0
+        direction = rules.UP
+    if player == PLAY_TILE:
+        move_tile_from_direction(direction)
+    elif player == PLAY_DIR:
+        move_dir(direction)
+
+
+# ---------------------------
+# game automaton
+
+
+def move_dir(direction):
+    global player, board
+    old = board
+    board = rules.move_dir(direction, old)
+    if game_log is not None and board is not old:
+        game_log.ply(old, PLAY_DIR, direction)
+    if board is old:
+        if is_interactive:
+            help_interactive("direction {0} does not change the board".format(
+                rules.DIR_NAME[direction]))
+        else:
+            print("ERROR: direction {0} is invalid !".format(
+                rules.DIR_NAME[direction]))
+            assert False
+    else:
+        update()
+        player = PLAY_TILE
+    run_next_player()
+
+
+def move_tile(move):
+    global player, num_tiles
+    num_tiles += 1
+    if game_log is not None:
+        before = [line.copy() for line in board]
+    rules.move_tile(move, board)
+    if game_log is not None:
+        game_log.ply(before, PLAY_TILE, move)
+    tiles[move[0]][move[1]].update_from_board()
+    if rules.game_over(board):
+        player = GAME_OVER
+    else:
+        player = PLAY_DIR
+    run_next_player()
+
+
+def run_next_player():
+    window.wm_title("play2048 -- num tiles={0} -- next player={1}".format(
+        num_tiles,
+        PLAYER_NAME[player]))
+    if player == GAME_OVER:
+        uninteractive()
+        stop_autoplayers()
+        if recorder is not None:
+            recorder.game_end(num_tiles)
+            recorder.finish()
+        if game_log is not None:
+            save_game_log()
+        window.configure(bg="#880000")
+        update()
+        if askplayer_helper:
+            update_helper("Now, game is over !")
+        return
+    if config.OBSERVER is not None:
+        try:
+            config.OBSERVER(board, player)
+        except:
+            close_on_error()
+    if RUN_PLAYER[player] is None:
+        interactive()
+        if askplayer_helper:
+            update_helper("Now, please, play a {0}...".format(
+                PLAYER_NAME[player]))
+        return
+    uninteractive()
+    start_autoplayer()
+
@@ -0,0 +1,208 @@
+"""Opt-in instrumentation of mean_score and play2048 (see config.INSTRUMENT)
+
+enable() replaces the core functions of rules (and of bitboard, when games
+are played on bitboards: see config.BITBOARD), and the players of config, by wrappers recording the latency of each call, and chains an
+observer on config.OBSERVER recording the duration of each turn.
+Nothing is wrapped until enable() is called, so a run without
+instrumentation pays nothing.
+
+Latencies are counted in histograms with logarithmic buckets, which are
+cheap to merge between processes; percentiles are bucket upper bounds.
+"""
+
+import json
+import math
+import time
+
+import rules
+import config
+
+BASE = 1e-7  # upper bound (seconds) of the first bucket
+RATIO = 2 ** 0.25  # ratio between the bounds of consecutive buckets
+_LOG_RATIO = math.log(RATIO)
+
+RULES_FUNCTIONS = ('game_over', 'move_dir', 'move_dir_possible', 'move_tile',
+                   'apply_dir', 'undo', 'is_full', 'max_tile', 'level')
+BITBOARD_FUNCTIONS = ('game_over', 'move_dir', 'move_dir_possible', 'move_tile',
+                      'is_full', 'max_tile')
+
+RECORDER = None  # Recorder of this process, once enabled
+
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = {}  # bucket index -> number of calls
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, t):
+        k = int(math.log(t / BASE) / _LOG_RATIO) + 1 if t > BASE else 0
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+        self.count += 1
+        self.total += t
+        if t > self.max:
+            self.max = t
+
+    def take(self):
+        """a copy of this histogram, which is then emptied"""
+        res = Histogram()
+        res.buckets, res.count, res.total, res.max = (
+            self.buckets, self.count, self.total, self.max)
+        self.__init__()
+        return res
+
+    def merge(self, other):
+        for k, n in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """upper bound of the latency of p percent of the calls"""
+        if not self.count:
+            return 0.
+        rank = p / 100 * self.count
+        seen = 0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen >= rank:
+                return min(BASE * RATIO ** k, self.max)
+        return self.max
+
+    def summary(self):
+        return {'calls': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else 0.,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'buckets': {'{0:.3g}'.format(BASE * RATIO ** k): n
+                            for k, n in sorted(self.buckets.items())}}
+
+
+class Recorder:
+
+    def __init__(self):
+        self.histograms = {}
+        self.games = []  # (moves, seconds) of each finished game
+        self.game_start_time = None
+        self.turn_player = None
+        self.turn_start = None
+
+    def histogram(self, name):
+        h = self.histograms.get(name)
+        if h is None:
+            h = self.histograms[name] = Histogram()
+        return h
+
+    def wrap(self, name, f):
+        """f, recording the latency of its calls under 'name'"""
+        add = self.histogram(name).add
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return f(*args)
+            finally:
+                add(clock() - start)
+        wrapper.instrumented = f
+        return wrapper
+
+    def observer(self, previous=None):
+        """observer for config.OBSERVER, recording the duration of each turn
+           under 'turn.<PLAYER>', then calling the 'previous' observer"""
+        def observer(board, player):
+            now = time.perf_counter()
+            self.end_turn(now)
+            self.turn_player = player
+            self.turn_start = now
+            if previous is not None:
+                previous(board, player)
+        observer.instrumented = previous
+        return observer
+
+    def end_turn(self, now):
+        if self.turn_start is not None:
+            self.histogram('turn.' + rules.PLAYER_NAME[self.turn_player]).add(
+                now - self.turn_start)
+            self.turn_start = None
+
+    def game_start(self):
+        self.game_start_time = time.perf_counter()
+        self.turn_start = None
+
+    def game_end(self, moves):
+        now = time.perf_counter()
+        self.end_turn(now)
+        self.games.append((moves, now - self.game_start_time))
+
+    def pop(self):
+        """(histograms, games) recorded since the last pop, to be merged"""
+        res = ({name: h.take() for name, h in self.histograms.items() if h.count},
+               self.games)
+        self.games = []
+        return res
+
+    def merge(self, popped):
+        histograms, games = popped
+        for name, h in histograms.items():
+            self.histogram(name).merge(h)
+        self.games.extend(games)
+
+    def summary(self):
+        rates = [moves / seconds for moves, seconds in self.games if seconds > 0]
+        return {'functions': {name: h.summary()
+                              for name, h in sorted(self.histograms.items())
+                              if h.count},
+                'games': {'number': len(self.games),
+                          'moves': [moves for moves, _ in self.games],
+                          'seconds': [seconds for _, seconds in self.games],
+                          'moves_per_second': sum(rates) / len(rates) if rates else 0.}}
+
+    def report(self):
+        print("{0:<40} {1:>10} {2:>10} {3:>10} {4:>10}".format(
+            "CALLS (seconds)", "number", "p50", "p95", "p99"))
+        for name, h in sorted(self.histograms.items()):
+            if not h.count:
+                continue
+            print("{0:<40} {1:>10} {2:>10.3g} {3:>10.3g} {4:>10.3g}".format(
+                name, h.count, h.percentile(50), h.percentile(95), h.percentile(99)))
+        print("MEAN MOVES PER SECOND:", self.summary()['games']['moves_per_second'])
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def finish(self):
+        """print the report, and dump it if config.INSTRUMENT is a file path"""
+        self.report()
+        if isinstance(config.INSTRUMENT, str):
+            self.dump(config.INSTRUMENT)
+
+
+def enable(wrap_players=True):
+    """instrument this process (once) and return its Recorder"""
+    global RECORDER
+    if RECORDER is not None:
+        return RECORDER
+    RECORDER = Recorder()
+    for name in RULES_FUNCTIONS:
+        setattr(rules, name, RECORDER.wrap('rules.' + name, getattr(rules, name)))
+    if config.BITBOARD:
+        import bitboard  # builds or loads its tables: only for its games
+        for name in BITBOARD_FUNCTIONS:
+            setattr(bitboard, name, RECORDER.wrap('bitboard.' + name, getattr(bitboard, name)))
+    if wrap_players:
+        # NB: wrapped players are no more replaced by their bitboard namesakes
+        for attr, kind in (('TILE_PLAYER', 'TILE'), ('DIRECTION_PLAYER', 'DIRECTION')):
+            player = getattr(config, attr)
+            if player is not None:
+                name = 'player.{0}.{1}'.format(kind, getattr(player, '__name__', player))
+                setattr(config, attr, RECORDER.wrap(name, player))
+    config.OBSERVER = RECORDER.observer(config.OBSERVER)
+    return RECORDER
@@ -1,23 +1,61 @@
 #! /usr/bin/env python3
 """
 Compute the average score to '2048' between automatic players.
+
+See config.py for the settings of a run, or the options below.
+
+    python3 mean_score.py -d coop_direction --depth 4 -n 1000 --seed 1 --workers 0
 """
 
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
 import rules
 import config
-import time
+import cli
+import players
+import trajectory
+import stats
+
+# observer of the games: the one of instrument, when enabled. Observers of
+# config.OBSERVER are for play2048 only: they may wait for the user.
+OBSERVER = None
+
+# values of config sent to the workers of parallel_games
+WORKER_SETTINGS = ('TILE_PLAYER', 'DIRECTION_PLAYER', 'BASELINE', 'DEPTH', 'INIT_BOARD',
+                   'BOARD_SIZE', 'FIRST_PLAYER', 'BITBOARD', 'INSTRUMENT', 'RECORD')
+
+# values of config of a run, kept by its result log: a run is only resumed
+# with the same ones (see run_config)
+RUN_SETTINGS = ('TILE_PLAYER', 'DIRECTION_PLAYER', 'BASELINE', 'DEPTH', 'TILE_BEAM',
+                'MAX_DEPTH', 'INIT_BOARD', 'BOARD_SIZE', 'FIRST_PLAYER', 'BITBOARD')
 
 
 def game_direction_first(dir_player, tile_player, board):
+    observer = OBSERVER
+    log = trajectory.GAME_LOG
     i = 0
     while not rules.game_over(board):
+        if observer is not None:
+            observer(board, 1)  # next player is DIRECTION, as in play2048
         direction = dir_player(board)
         assert(direction is not None) #On peut jouer
         assert(0 <= direction < 4) #On ne peut jouer que 4 directions
         assert(rules.move_dir_possible(direction, board))
+        if log is not None:
+            log.ply(board, 1, direction)
         board = rules.move_dir(direction, board)
+        if observer is not None:
+            observer(board, 0)
         tuile = tile_player(board)
         assert(tuile is not None)
+        if log is not None:
+            log.ply(board, 0, tuile)
         rules.move_tile(tuile, board)
         i += 1
     return (1 << rules.max_tile(board), i) #1 << a is 2 ** a
@@ -28,23 +66,318 @@ def game_tile_first(dir_player, tile_player, board):
     if rules.is_full(board):
         return (1 << rules.max_tile(board), 0)
     
+    if OBSERVER is not None:
+        OBSERVER(tab, 0)
     if tile_player(tab) is not None:
-        rules.move_tile(tile_player(tab), tab)
+        tuile = tile_player(tab)
+        if trajectory.GAME_LOG is not None:
+            trajectory.GAME_LOG.ply(tab, 0, tuile)
+        rules.move_tile(tuile, tab)
     
     tuile_max, nombre_coups = game_direction_first(dir_player, tile_player, tab)
     return tuile_max, nombre_coups + 1
 
 
+def bitboard_direction_first(dir_player, tile_player, board):
+    """same as game_direction_first, played on a packed int (see bitboard.py)"""
+    import bitboard  # only needed by this engine
+    dir_player = bitboard.native(dir_player)
+    tile_player = bitboard.native(tile_player)
+    observer = OBSERVER
+    log = trajectory.GAME_LOG
+    b = bitboard.to_int(board)
+    if (observer is None and log is None and dir_player in bitboard.LOOP_PLAYERS
+            and tile_player in bitboard.LOOP_PLAYERS):
+        return bitboard.play(dir_player, tile_player, b)
+    i = 0
+    while not bitboard.game_over(b):
+        if observer is not None:
+            observer(bitboard.to_board(b), 1)
+        direction = dir_player(b)
+        assert(direction is not None)
+        assert(0 <= direction < 4)
+        if log is not None:
+            log.ply_int(b, 1, direction)
+        old, b = b, bitboard.move_dir(direction, b)
+        assert(b != old)  # as move_dir_possible(direction, old), at no cost
+        if observer is not None:
+            observer(bitboard.to_board(b), 0)
+        tuile = tile_player(b)
+        assert(tuile is not None)
+        if log is not None:
+            log.ply_int(b, 0, tuile)
+        b = bitboard.move_tile(tuile, b)
+        i += 1
+    return (1 << bitboard.max_tile(b), i)
+
+
+def bitboard_tile_first(dir_player, tile_player, board):
+    """same as game_tile_first, played on a packed int (see bitboard.py)"""
+    import bitboard
+    b = bitboard.to_int(board)
+    if bitboard.is_full(b):
+        return (1 << bitboard.max_tile(b), 0)
+
+    if OBSERVER is not None:
+        OBSERVER(bitboard.to_board(b), 0)
+    native_tile = bitboard.native(tile_player)
+    if native_tile(b) is not None:
+        tuile = native_tile(b)  # played twice, as in game_tile_first
+        if trajectory.GAME_LOG is not None:
+            trajectory.GAME_LOG.ply_int(b, 0, tuile)
+        b = bitboard.move_tile(tuile, b)
+
+    tuile_max, nombre_coups = bitboard_direction_first(
+        dir_player, tile_player, bitboard.to_board(b))
+    return tuile_max, nombre_coups + 1
+
+
+GAMES = ((game_tile_first, game_direction_first),  # list-of-lists boards
+         (bitboard_tile_first, bitboard_direction_first))  # bitboards
+
+
+def game_seed(master, i):
+    """seed of the game number i of a run of master seed 'master'.
+       It does not depend on the number of workers playing the run."""
+    digest = hashlib.sha256("{0}:{1}".format(master, i).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def play_game(i):
+    """play the game number i of the run described in config.
+       Returns (i, max tile, number of moves, records) where records are
+       (instrumentation records, trajectory.GameLog, (max tile, number of
+       moves) of config.BASELINE on the same game), None when disabled,
+       and the wall time of the game in seconds"""
+    start = time.time()
+    if config.SEED is not None:
+        random.seed(game_seed(config.SEED, i))
+    if config.BASELINE is not None:
+        state = random.getstate()
+    game = GAMES[bool(config.BITBOARD)][config.FIRST_PLAYER]
+    recorder = None
+    if config.INSTRUMENT:
+        import instrument
+        recorder = instrument.RECORDER
+        recorder.game_start()
+    log = trajectory.GAME_LOG = trajectory.GameLog(i) if config.RECORD else None
+    board = rules.start_board(config.INIT_BOARD)
+    players.new_game()
+    ss, nn = game(config.DIRECTION_PLAYER,
+                  config.TILE_PLAYER,
+                  board)
+    trajectory.GAME_LOG = None
+    if recorder is not None:
+        recorder.game_end(nn)
+        recorder = recorder.pop()
+    baseline = None
+    if config.BASELINE is not None:
+        random.setstate(state)  # same random numbers as the game above
+        players.new_game()
+        baseline = game(config.BASELINE, config.TILE_PLAYER, board)
+    return i, ss, nn, (recorder, log, baseline, time.time() - start)
+
+
+def serial_games(numbers):
+    """generate the results (i, max tile, number of moves, records)
+       of the games of 'numbers'"""
+    for i in numbers:
+        print("running game:", i + 1)
+        yield play_game(i)
+
+
+def enable_instrument():
+    """instrument this process, its games being observed by the recorder"""
+    global OBSERVER
+    import instrument
+    OBSERVER = instrument.enable().observer()
+
+
+def init_worker(settings):
+    """set config in a worker from the 'settings' of the run. A forked
+       worker already has them, but for its players, which may be wrapped
+       by instrument: players already loaded are kept. A spawned worker
+       imports config.py afresh, and only the modules of its players."""
+    for name, value in settings.items():
+        if not callable(getattr(config, name)):
+            setattr(config, name, value)
+    cli.load_players()
+    rules.set_size(config.BOARD_SIZE)
+    if config.INSTRUMENT:
+        enable_instrument()
+
+
+def parallel_games(numbers, workers, chunk_size, settings):
+    """same as serial_games, on a pool of 'workers' processes, of config
+       'settings' (see init_worker).
+       Results are generated as soon as they arrive, in any order
+       (mean_score puts them back in order for its statistics).
+       Progress is reported by this process only, on stderr."""
+    settings = dict(settings, SEED=config.SEED)
+    if settings['SEED'] is None:
+        # each game needs its own seed, workers start with the same state
+        settings['SEED'] = random.randrange(1 << 32)
+    with multiprocessing.Pool(workers, init_worker, (settings,)) as pool:
+        last = time.time()
+        done = 0
+        for res in pool.imap_unordered(play_game, numbers, chunk_size):
+            done += 1
+            if done == len(numbers) or time.time() - last >= config.PROGRESS_PERIOD:
+                sys.stderr.write("\rfinished games: {0}/{1}".format(done, len(numbers)))
+                sys.stderr.flush()
+                last = time.time()
+            yield res
+    sys.stderr.write("\n")
+
+
+# ---------------------------
+# result log
+
+
+def run_config():
+    """values of RUN_SETTINGS in config, as written in a result log: players
+       by their name, boards as JSON lists"""
+    res = {}
+    for name in RUN_SETTINGS:
+        value = getattr(config, name)
+        if name in ('TILE_PLAYER', 'DIRECTION_PLAYER', 'BASELINE'):
+            value = cli.name(value)
+        res[name] = json.loads(json.dumps(value))
+    return res
+
+
+def config_mismatch(path, header, run):
+    """message on the differences between the run config 'run' and the
+       'header' of the result log 'path', None if they are the same"""
+    logged = header.get('config')
+    if logged is None:
+        return "{0} keeps no run config (older log): start a new log".format(path)
+    diffs = ["{0} is {1!r} there, {2!r} here".format(name, logged.get(name), run.get(name))
+             for name in sorted(set(logged) | set(run)) if logged.get(name) != run.get(name)]
+    if diffs:
+        return "{0} is the log of another run: {1}".format(path, "; ".join(diffs))
+    return None
+
+
+def load_results(path):
+    """(header, {i: entry of game i}) of the result log 'path'. Its header
+       holds the master seed and the run config, None for a new log."""
+    header, entries = None, {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # line cut by a killed run
+                    continue
+                if 'game' in entry:
+                    entries[entry['game']] = entry
+                else:
+                    header = entry
+    return header, entries
+
+
+class ResultLog:
+    """line-oriented log of the results of the games of a run: its header
+       (master seed and run config), then a JSON line per finished game,
+       flushed at once, and synced on disk every config.PROGRESS_PERIOD
+       seconds"""
+
+    def __init__(self, path, header):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, 'r+b') as f:  # drop a line cut by a killed run
+                data = f.read()
+                f.truncate(data.rfind(b'\n') + 1)
+        self.file = open(path, 'a')
+        self.synced = time.time()
+        if new:
+            self.write(header)
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        if time.time() - self.synced >= config.PROGRESS_PERIOD:
+            os.fsync(self.file.fileno())
+            self.synced = time.time()
+
+    def add(self, i, ss, nn, baseline, seconds):
+        self.write({'game': i, 'max_tile': ss, 'moves': nn,
+                    'seed': game_seed(config.SEED, i), 'time': seconds,
+                    'baseline': baseline})
+
+    def close(self):
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def logged_games(entries):
+    """generate the results of the logged games, as play_game"""
+    for i in sorted(entries):
+        e = entries[i]
+        baseline = e['baseline'] if e['baseline'] is None else tuple(e['baseline'])
+        yield i, e['max_tile'], e['moves'], (None, None, baseline, e['time'])
+
+
+def resumed_games(entries, results):
+    yield from logged_games(entries)
+    yield from results  # closing this closes 'results'
+
+
 def mean_score():
-    if config.FIRST_PLAYER == 0:
-        game = game_tile_first
-    else:
-        game = game_direction_first
+    settings = {name: getattr(config, name) for name in WORKER_SETTINGS}
+    cli.load_players()
+    rules.set_size(config.BOARD_SIZE)
+    if config.FIRST_PLAYER != 0:
         # NB: direction can not start the game on a empty board !
-        assert (config.INIT_BOARD != rules.EMPTYBOARD)
+        assert (rules.start_board(config.INIT_BOARD) != rules.EMPTYBOARD)
+    if config.BOARD_SIZE != 4:
+        # NB: bitboards and game records are of 4x4 boards only
+        assert not config.BITBOARD and not config.RECORD
     # NB: no interactive players here !
     assert config.TILE_PLAYER is not None
     assert config.DIRECTION_PLAYER is not None
+    if config.INSTRUMENT:
+        import instrument
+        enable_instrument()
+    writer = None
+    if config.RECORD:
+        writer = trajectory.Writer(config.RECORD, config.RECORD_COMPRESS)
+    numbers = range(config.GAMES_NUMBER)
+    result_log = None
+    if config.RESULTS:
+        # every game gets its seed, so that a resumed run goes on the same way
+        header, entries = load_results(config.RESULTS)
+        run = run_config()
+        if header is None:
+            seed = config.SEED if config.SEED is not None else random.randrange(1 << 32)
+            header = {'master_seed': seed, 'config': run}
+        seed = header['master_seed']
+        if config.SEED is not None and config.SEED != seed:
+            sys.exit("{0} is the log of a run of seed {1}".format(config.RESULTS, seed))
+        mismatch = config_mismatch(config.RESULTS, header, run)
+        if mismatch is not None:
+            sys.exit(mismatch)
+        config.SEED = seed
+        entries = {i: e for i, e in entries.items() if i < config.GAMES_NUMBER}
+        numbers = [i for i in numbers if i not in entries]
+        if entries:
+            print("RESUMED: {0} GAMES OF {1} ALREADY PLAYED".format(
+                len(entries), config.RESULTS))
+        result_log = ResultLog(config.RESULTS, header)
+    workers = config.WORKERS or os.cpu_count()
+    if workers > 1 and numbers:
+        results = parallel_games(numbers, workers, config.CHUNK_SIZE, settings)
+    else:
+        results = serial_games(numbers)
+    if result_log is not None:
+        results = resumed_games(entries, results)
+    game_stats = stats.GameStats()
+    stopper = stats.Stopper(config.STOP_METRIC, config.CONFIDENCE,
+                            config.STOP_WIDTH, config.MIN_GAMES)
+    pending = {}  # results of the games ended before the ones of smaller numbers
+    next_game = 0
+    games = 0
     n = 0
     s = 0
     best = 0
@@ -52,36 +385,71 @@ def mean_score():
     worst = None
     nworst = 0
     INIT_TIME = time.time()
-    for i in range(config.GAMES_NUMBER):
-        print("running game:", i + 1)
-        ss, nn = game(config.DIRECTION_PLAYER,
-                      config.TILE_PLAYER,
-                      config.INIT_BOARD)
-        n += nn
-        s += ss
-        if ss > best:
-            best = ss
-            nbest = 1
-        elif ss == best:
-            nbest += 1
-        if worst is None or ss < worst:
-            worst = ss
-            nworst = 1
-        elif ss == worst:
-            nworst += 1
+    for i, ss, nn, (records, log, baseline, seconds) in results:
+        if records is not None:
+            instrument.RECORDER.merge(records)
+        if log is not None:
+            writer.add(log)
+        if result_log is not None and i not in entries:
+            result_log.add(i, ss, nn, baseline, seconds)
+        # NB: statistics take the games in the order of their numbers: the
+        # games ending first (the shortest ones) must not bias an early stop
+        pending[i] = (ss, nn, baseline)
+        while next_game in pending and stopper.reason is None:
+            ss, nn, baseline = pending.pop(next_game)
+            next_game += 1
+            game_stats.add(ss, nn)
+            if baseline is not None:
+                stopper.add_pair((ss, nn), baseline)
+            games += 1
+            n += nn
+            s += ss
+            if ss > best:
+                best = ss
+                nbest = 1
+            elif ss == best:
+                nbest += 1
+            if worst is None or ss < worst:
+                worst = ss
+                nworst = 1
+            elif ss == worst:
+                nworst += 1
+            stopper.stop(game_stats)
+        if stopper.reason is not None:
+            break
+    results.close()  # stops the workers of an early stopped run
     print("TOTAL TIME:", time.time() - INIT_TIME)
+    if stopper.reason is not None:
+        print("STOPPED AFTER {0} GAMES: {1}".format(games, stopper.reason))
     print("MEAN MAX TILE:{0} -- MEAN TILE NUMBER: {1}".format(
-        s / config.GAMES_NUMBER,
-        n / config.GAMES_NUMBER))
+        s / games,
+        n / games))
     print("MAX of MAX TILE:{0} -- PROBA: {1}".format(
         best,
-        nbest / config.GAMES_NUMBER))
+        nbest / games))
     print("MIN of MAX TILE:{0} -- PROBA: {1}".format(
         worst,
-        nworst / config.GAMES_NUMBER))
+        nworst / games))
+    game_stats.report(config.CONFIDENCE)
+    if stopper.diffs.n:
+        lo, hi = stopper.diffs.interval(config.CONFIDENCE)
+        print("{0} MINUS BASELINE: {1:.4g} -- {2:.0%} INTERVAL: [{3:.4g}, {4:.4g}]".format(
+            config.STOP_METRIC.upper(), stopper.diffs.mean, config.CONFIDENCE, lo, hi))
+    if config.INSTRUMENT:
+        instrument.RECORDER.finish()
+    if writer is not None:
+        writer.close()
+    if result_log is not None:
+        result_log.close()
+
+
+def main():
+    args = cli.parser(__doc__.strip().split('\n\n')[0]).parse_args()
+    cli.configure(args)
+    mean_score()
 
 
 # CODE TO RUN when the file is used as a single executable
 if __name__ == "__main__":
-    mean_score()
+    main()
 
@@ -0,0 +1,223 @@
+#! /usr/bin/env python3
+"""N-tuple network: a value function of boards learned by TD(0)
+
+Each tuple is a list of cells; its weight table has an entry for each of
+the 16 ** len(tuple) contents of these cells (tiles above 2 ** 15 are
+counted as 2 ** 15). The tuple is sampled on the 8 symmetric versions of
+the board (rules.SYMMETRIES), and the value of a board is the sum of the
+weights of all these samples.
+
+The values are those of afterstates (boards just after a direction, before
+the tile): a direction is chosen by maximizing its merge score (the reward,
+see rules.slide) plus the value of its afterstate, and learning follows
+Szubert and Jaskowski, "Temporal Difference Learning of N-Tuple Networks
+for the Game 2048" (2014).
+
+Weights are a single flat float32 table, stored in a .npy file which is
+memory-mapped: processes using the same file share its pages.
+
+    python3 ntuple.py --games 10000              # train config.NTUPLE_WEIGHTS
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+import rules
+import config
+import players
+
+# the 4 6-tuples of Szubert and Jaskowski (64 MB of weights each)
+TUPLES = (((0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1)),
+          ((1, 0), (1, 1), (1, 2), (1, 3), (2, 0), (2, 1)),
+          ((0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)),
+          ((1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)))
+
+ALPHA = 0.1  # learning rate, shared among the samples of a board
+
+
+def size(tuples):
+    """number of weights of a network of 'tuples'"""
+    return sum(16 ** len(t) for t in tuples)
+
+
+class NTupleNetwork:
+
+    def __init__(self, weights, tuples=TUPLES):
+        if len(weights) != size(tuples):
+            raise ValueError("{0} weights for tuples needing {1}".format(
+                len(weights), size(tuples)))
+        self.weights = weights
+        self.tuples = tuples
+        # (offset of the table, flat cells) of each sample
+        self.samples = []
+        offset = 0
+        for t in tuples:
+            for perm in rules.SYMMETRIES:
+                cells = [perm[i][j] for i, j in t]
+                self.samples.append((offset, tuple(rules.SIZE * i + j
+                                                   for i, j in cells)))
+            offset += 16 ** len(t)
+
+    def indices(self, board):
+        """indices in weights of the samples of 'board'"""
+        cells = [v if v < 16 else 15 for line in board for v in line]
+        res = []
+        for offset, sample in self.samples:
+            k = 0
+            for c in sample:
+                k = (k << 4) | cells[c]
+            res.append(offset + k)
+        return res
+
+    def value(self, board):
+        return float(self.weights[self.indices(board)].sum())
+
+    def update(self, board, delta):
+        """add 'delta' to the value of 'board', spread on its samples"""
+        np.add.at(self.weights, self.indices(board),
+                  np.float32(delta / len(self.samples)))
+
+    def evaluate(self, board):
+        """(reward + value, direction, afterstate, reward) of the best
+           direction on 'board', or None if no direction can be played"""
+        best = None
+        for d in rules.DIRECTIONS:
+            gain = [0]
+            after = rules.move_dir(d, board, gain)
+            if after is board:
+                continue
+            v = gain[0] + self.value(after)
+            if best is None or v > best[0]:
+                best = (v, d, after, gain[0])
+        return best
+
+    def direction(self, board):
+        """best direction on 'board': usable as a direction player"""
+        best = self.evaluate(board)
+        if best is not None:
+            return best[1]
+
+    def directions(self, boards):
+        """best directions on 'boards', the afterstates of all of them
+           being valued by a single gather in the weights"""
+        moves = []  # (rank of the board, direction, reward, afterstate)
+        for k, board in enumerate(boards):
+            for d in rules.DIRECTIONS:
+                gain = [0]
+                after = rules.move_dir(d, board, gain)
+                if after is not board:
+                    moves.append((k, d, gain[0], after))
+        res = [None] * len(boards)
+        if not moves:
+            return res
+        indices = [self.indices(after) for _, _, _, after in moves]
+        values = self.weights[indices].sum(axis=1)
+        best = [None] * len(boards)
+        for (k, d, reward, _), v in zip(moves, values.tolist()):
+            if best[k] is None or reward + v > best[k]:
+                best[k] = reward + v
+                res[k] = d
+        return res
+
+    def learn_game(self, alpha=ALPHA, tile_player=players.random_tile):
+        """play a game against 'tile_player', learning from each move.
+           Returns (merge score, max tile, number of moves)"""
+        board = [line.copy() for line in rules.EMPTYBOARD]
+        rules.move_tile(tile_player(board), board)
+        score = moves = 0
+        previous = None  # afterstate of the previous move
+        while True:
+            best = self.evaluate(board)
+            if best is None:
+                break
+            v, _, after, reward = best
+            if previous is not None:
+                # the target of the previous afterstate is reward + value
+                self.update(previous, alpha * (v - self.value(previous)))
+            previous = after
+            score += reward
+            moves += 1
+            board = [line.copy() for line in after]
+            rules.move_tile(tile_player(board), board)
+        if previous is not None:
+            self.update(previous, -alpha * self.value(previous))
+        return score, rules.max_tile(board), moves
+
+
+# ---------------------------
+# weight files
+
+
+def create(path, tuples=TUPLES):
+    """new network of zero weights, memory-mapped on the file 'path'"""
+    weights = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                        shape=(size(tuples),))
+    return NTupleNetwork(weights, tuples)
+
+
+def load(path, tuples=TUPLES, writable=False):
+    """network memory-mapped on the file 'path' (read-only by default)"""
+    weights = np.load(path, mmap_mode='r+' if writable else 'r')
+    return NTupleNetwork(weights, tuples)
+
+
+_network = None
+
+
+def network():
+    """read-only network of config.NTUPLE_WEIGHTS, loaded on first use"""
+    global _network
+    if _network is None:
+        _network = load(config.NTUPLE_WEIGHTS)
+    return _network
+
+
+# ---------------------------
+# training
+
+
+def train(net, games, alpha=ALPHA, report=1000):
+    """learn from 'games' games, printing stats every 'report' games"""
+    start = time.time()
+    scores, tiles = [], []
+    for k in range(1, games + 1):
+        score, tile, _ = net.learn_game(alpha)
+        scores.append(score)
+        tiles.append(tile)
+        if k % report == 0 or k == games:
+            print("games: {0} -- mean score: {1:.0f} -- P(2048): {2:.3f} -- {3:.0f} games/hour".format(
+                k, sum(scores) / len(scores),
+                sum(t >= 11 for t in tiles) / len(tiles),
+                k / (time.time() - start) * 3600))
+            sys.stdout.flush()
+            scores, tiles = [], []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="train an n-tuple network by TD(0)")
+    parser.add_argument('-w', '--weights', default=config.NTUPLE_WEIGHTS,
+                        help="weight file, created if missing (default: config.NTUPLE_WEIGHTS)")
+    parser.add_argument('--games', type=int, default=config.GAMES_NUMBER)
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--report', type=int, default=100,
+                        help="games between two progress reports")
+    parser.add_argument('--seed', type=int, default=config.SEED)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    if os.path.exists(args.weights):
+        net = load(args.weights, writable=True)
+    else:
+        net = create(args.weights)
+    train(net, args.games, args.alpha, args.report)
+    net.weights.flush()
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 
 import rules
 import random
+import time
+import os
+import multiprocessing
 import config
 
 VALS = (1, 1, 1, 1, 1, 1, 1, 1, 1, 2)
@@ -51,17 +54,341 @@ def basic_coop_tile(board):
 
     top_score = 0
     i_max, j_max = 0, 0
-    for i, line in enumerate(board):
-        for j, valeur in enumerate(line):
-            if valeur == 0:
-                board[i][j] = 2
-                test = basic_coop_score(board)
-                board[i][j] = 0
-                if top_score < test:
-                    top_score = test
-                    i_max, j_max = i, j
+    level = rules.LevelTracker(board)  # basic_coop_score, updated cell by cell
+    for i, j in cases_possibles(board):
+        test = level.value_with((i, j, 2))
+        if top_score < test:
+            top_score = test
+            i_max, j_max = i, j
     
     return (i_max, j_max, 2)
 
 def basic_coop_score(board):
-    return rules.level(board)
\ No newline at end of file
+    return rules.level(board)
+
+#----------------------------coop-------------------------------
+
+LOST = float('-inf')  # value of a board where no direction can be played
+
+
+class SearchTimeout(Exception):
+    """raised by a CoopSearch running past its deadline"""
+
+
+class CoopSearch:
+    """Cooperative search: the direction player and the tile player both
+       maximize 'evaluate' (default: basic_coop_score) 'depth' plies ahead,
+       a ply being a direction or a tile.
+
+       Children are searched best first, according to 'evaluate'.
+       At tile plies, only the 'beam' placements of best static value are
+       searched (None means all placements). This is a heuristic: a pruned
+       placement may lead to a better subtree, so that the value of a board
+       is then a lower bound of its full search.
+
+       Searched boards are stored in 'table' (a TranspositionTable) if any,
+       which must only be shared by searches of the same evaluation.
+
+       Once time.perf_counter() is past 'deadline', searching a new board
+       raises SearchTimeout.
+    """
+
+    def __init__(self, evaluate=None, beam=None, table=None, deadline=None):
+        self.evaluate = evaluate or basic_coop_score
+        self.beam = beam
+        self.table = table
+        self.deadline = deadline
+        import transposition  # only needed by the search players
+        self.bound = transposition.EXACT if beam is None else transposition.LOWER
+        self.turns = transposition.TILE, transposition.DIRECTION  # keys of table
+        self.nodes = 0  # number of boards searched
+
+    def visit(self):
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def directions(self, board, first=None):
+        """[(static value, direction)] best first, but direction 'first'
+           is searched first. 'board' is restored after each direction."""
+        res = []
+        for d in rules.DIRECTIONS:
+            record = rules.apply_dir(d, board)
+            if record is not None:
+                res.append((self.evaluate(board), d))
+                rules.undo(board, record)
+        res.sort(key=lambda x: (x[1] == first, x[0]), reverse=True)
+        return res
+
+    def tiles(self, board):
+        """[(static value, tile move)] best first, of the searched tiles.
+           'board' is restored after each placement."""
+        res = []
+        # basic_coop_score of each placement is updated from the board's one
+        level = rules.LevelTracker(board) if self.evaluate is basic_coop_score else None
+        for i, j in cases_possibles(board):
+            for v in (1, 2):
+                if level is not None:
+                    res.append((level.value_with((i, j, v)), (i, j, v)))
+                    continue
+                board[i][j] = v
+                res.append((self.evaluate(board), (i, j, v)))
+                board[i][j] = 0
+        res.sort(key=lambda x: x[0], reverse=True)
+        if self.beam is not None:
+            del res[self.beam:]
+        return res
+
+    def direction_value(self, board, depth):
+        """value of 'board' when the direction player is to play"""
+        return self.search_direction(board, depth)[0]
+
+    def search_direction(self, board, depth):
+        """(value, best direction) of 'board', the direction player to play.
+           'board' is changed in place during the search, and restored."""
+        self.visit()
+        if depth == 0:
+            return self.evaluate(board), None
+        key, first = None, None
+        if self.table is not None:
+            key = self.table.key(board, self.turns[1])
+            entry = self.table.probe(key, depth)
+            if entry is not None:
+                return entry[0], entry[2]
+            first = self.table.best_direction(key)
+        best, res = LOST, None
+        for _, d in self.directions(board, first):
+            record = rules.apply_dir(d, board)
+            value = self.tile_value(board, depth - 1)
+            rules.undo(board, record)
+            if res is None or value > best:
+                best, res = value, d
+        if self.table is not None:
+            self.table.store(key, depth, best, self.bound, res)
+        return best, res
+
+    def tile_value(self, board, depth):
+        """value of 'board' when the tile player is to play"""
+        self.visit()
+        if depth == 0:
+            return self.evaluate(board)
+        key = None
+        if self.table is not None:
+            key = self.table.key(board, self.turns[0])
+            entry = self.table.probe(key, depth)
+            if entry is not None:
+                return entry[0]
+        best = None
+        for _, (i, j, v) in self.tiles(board):
+            board[i][j] = v
+            value = self.direction_value(board, depth - 1)
+            board[i][j] = 0
+            if best is None or value > best:
+                best = value
+        if best is None:  # full board
+            best = self.direction_value(board, depth - 1)
+        if self.table is not None:
+            self.table.store(key, depth, best, self.bound)
+        return best
+
+    def best_direction(self, board, depth):
+        # the search is made on a copy: a SearchTimeout leaves it changed
+        return self.search_direction([line.copy() for line in board], depth)[1]
+
+    def best_tile(self, board, depth):
+        board = [line.copy() for line in board]
+        best, res = None, None
+        for _, (i, j, v) in self.tiles(board):
+            board[i][j] = v
+            value = self.direction_value(board, depth - 1)
+            board[i][j] = 0
+            if best is None or value > best:
+                best, res = value, (i, j, v)
+        return res
+
+
+_coop_table = None
+
+
+def coop_table():
+    """transposition table shared by the coop players along a game"""
+    global _coop_table
+    if _coop_table is None:
+        import transposition
+        _coop_table = transposition.TranspositionTable(config.TT_SIZE,
+                                                       config.TT_POLICY)
+    return _coop_table
+
+
+def new_game():
+    """forget the searches of the previous games of this process: deeper
+       entries of the table would change the moves of the next game, which
+       must only depend on its seed"""
+    if _coop_table is not None:
+        _coop_table.clear()
+
+
+def coop_search():
+    return CoopSearch(beam=config.TILE_BEAM, table=coop_table())
+
+
+def coop_direction(board):
+    return coop_search().best_direction(board, config.DEPTH)
+
+
+def coop_tile(board):
+    return coop_search().best_tile(board, config.DEPTH)
+
+
+#----------------------------anytime----------------------------
+
+SEARCH_INFO = {'depth': 0, 'nodes': 0, 'time': 0.}  # last anytime search
+
+
+def anytime_depths(board):
+    """depths tried by anytime_direction on 'board', from 2 up: cheap depths
+       are always completed first. Crowded boards, where tile plies have
+       fewer placements, go deeper than config.MAX_DEPTH"""
+    empty = len(cases_possibles(board))
+    extra = 0 if empty > 6 else 2 if empty > 2 else 4
+    return range(2, config.MAX_DEPTH + extra + 1)
+
+
+def anytime_direction(board):
+    """coop search deepened until config.MOVE_BUDGET milliseconds
+       (config.WAIT_DURATION if None) are spent. It plays the best direction
+       of the deepest completed search, at least a 1-ply one."""
+    budget = config.MOVE_BUDGET
+    if budget is None:
+        budget = config.WAIT_DURATION
+    search = coop_search()  # the table is created before the clock starts
+    start = time.perf_counter()
+    best = search.best_direction(board, 1)
+    reached = 1
+    search.deadline = start + budget / 1000
+    try:
+        for depth in anytime_depths(board):
+            best = search.best_direction(board, depth)
+            reached = depth
+    except SearchTimeout:
+        pass
+    SEARCH_INFO['depth'] = reached
+    SEARCH_INFO['nodes'] = search.nodes
+    SEARCH_INFO['time'] = time.perf_counter() - start
+    if config.SEARCH_REPORT:
+        print("anytime_direction: depth {depth}, {nodes} nodes in {time:.3f}s".format(
+            **SEARCH_INFO))
+    return best
+
+#----------------------------montecarlo-------------------------
+
+_ROLLOUT_POOL = None  # process pool of montecarlo_direction, once started
+
+
+def rollout(board, direction, rng, depth):
+    """merge score of playing 'direction' on 'board', then random tiles (as
+       random_tile) and random directions drawn from 'rng', for 'depth'
+       directions or until the game is over if 'depth' is None"""
+    gain = [0]
+    board = [line.copy() for line in board]  # played in place
+    rules.apply_dir(direction, board, gain)
+    moves = 0
+    while depth is None or moves < depth:
+        possible = cases_possibles(board)
+        if not possible:
+            break
+        coup = rng.choice(VALS)
+        i, j = rng.choice(possible)
+        rules.move_tile((i, j, coup), board)
+        directions = [d for d in rules.DIRECTIONS if rules.move_dir_possible(d, board)]
+        if not directions:
+            break
+        rules.apply_dir(rng.choice(directions), board, gain)
+        moves += 1
+    return gain[0]
+
+
+def rollout_batch(task):
+    """[total merge score of the rollouts of each direction] of a task
+       (board, directions, first seed, number of rollouts, depth).
+       Rollout k of every direction uses the same seed: the directions
+       are compared on the same random tiles (common random numbers)."""
+    board, directions, seed, count, depth = task
+    totals = [0] * len(directions)
+    for k in range(seed, seed + count):
+        for n, d in enumerate(directions):
+            totals[n] += rollout(board, d, random.Random(k), depth)
+    return totals
+
+
+def rollout_pool(workers):
+    """pool of 'workers' processes, or None to roll out in this process
+       (daemon processes, such as the workers of mean_score, have no pool)"""
+    global _ROLLOUT_POOL
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if _ROLLOUT_POOL is None:
+        _ROLLOUT_POOL = multiprocessing.Pool(workers)
+    return _ROLLOUT_POOL
+
+
+def montecarlo_direction(board):
+    """direction of the best mean merge score over config.ROLLOUTS random
+       playouts of config.ROLLOUT_DEPTH directions, or over as many as
+       config.ROLLOUT_BUDGET milliseconds allow if it is not None"""
+    directions = [d for d in rules.DIRECTIONS if rules.move_dir_possible(d, board)]
+    if len(directions) <= 1:
+        return directions[0] if directions else None
+    budget = config.ROLLOUT_BUDGET
+    deadline = None if budget is None else time.perf_counter() + budget / 1000
+    workers = config.ROLLOUT_WORKERS or os.cpu_count()
+    pool = rollout_pool(workers)
+    batch = config.ROLLOUT_BATCH
+    seed = random.getrandbits(32) << 32  # seeds of the rollouts of this move
+    totals = [0] * len(directions)
+    done = 0
+    while True:
+        if deadline is None:
+            count = config.ROLLOUTS - done
+        else:  # a round of one batch per process
+            count = batch * (workers if pool is not None else 1)
+        tasks = [(board, directions, seed + done + k, min(batch, count - k),
+                  config.ROLLOUT_DEPTH) for k in range(0, count, batch)]
+        results = map(rollout_batch, tasks) if pool is None \
+            else pool.imap_unordered(rollout_batch, tasks)
+        for res in results:
+            totals = [a + b for a, b in zip(totals, res)]
+        done += count
+        if deadline is None or time.perf_counter() >= deadline:
+            break
+    best = max(range(len(directions)), key=lambda n: totals[n])
+    return directions[best]
+
+#----------------------------ntuple-----------------------------
+
+def ntuple_direction(board):
+    """best direction for the n-tuple network of config.NTUPLE_WEIGHTS"""
+    import ntuple  # NumPy is only needed by this player
+    return ntuple.network().direction(board)
+
+
+def _ntuple_directions(boards):
+    import ntuple
+    return ntuple.network().directions(boards)
+
+
+ntuple_direction.batch = _ntuple_directions  # used by server.py
+
+
+#----------------------------remote-----------------------------
+
+def remote_direction(board):
+    """direction played by the decision server of config.SERVER_ADDRESS"""
+    import server
+    return server.client().direction(board)
+
+
+def remote_tile(board):
+    """tile played by the decision server of config.SERVER_ADDRESS"""
+    import server
+    return server.client().tile(board)
@@ -0,0 +1,157 @@
+"""Prioritized experience replay buffer of transitions of 2048
+
+A transition is (board, direction, reward, next board, done), the boards
+being packed into uint64 as in bitboard.py. Transitions are stored in
+fixed-capacity NumPy arrays used as a ring buffer: about 22 bytes each,
+plus 16 to 32 bytes of priority (float64 nodes of a sum tree of a power of
+2 leaves), none when sampling uniformly.
+
+Sampling is either uniform, or proportional to priority ** alpha using a
+sum tree (Schaul et al., "Prioritized Experience Replay", 2016): sampling
+and priority updates cost O(log n) per transition, and are done for a
+whole batch at once. Batches are dicts of contiguous arrays.
+"""
+
+import numpy as np
+
+import rules
+import bitboard
+
+SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def pack(board):
+    """uint64 of a list-of-lists board"""
+    return np.uint64(bitboard.to_int(board))
+
+
+def unpack(boards):
+    """(N, SIZE, SIZE) uint8 log2 boards of an array of N packed boards"""
+    boards = np.asarray(boards, dtype=np.uint64)
+    cells = (boards[..., None] >> SHIFTS) & np.uint64(15)
+    return cells.astype(np.uint8).reshape(boards.shape + (rules.SIZE, rules.SIZE))
+
+
+class SumTree:
+    """binary tree of the sums of 'capacity' non-negative leaves"""
+
+    def __init__(self, capacity):
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.tree = np.zeros(2 * self.leaves)  # node k has children 2k, 2k+1
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[self.leaves + np.asarray(indices)]
+
+    def update(self, indices, values):
+        """set the leaves 'indices' to 'values' (the last wins on duplicates)"""
+        nodes = self.leaves + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = values
+        while nodes[0] > 1:  # all the nodes are at the same depth
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """leaves where the prefix sums reach 'values' (an array)"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        tree = self.tree
+        while nodes[0] < self.leaves:
+            left = tree[2 * nodes]
+            right = values >= left
+            values -= left * right
+            nodes = 2 * nodes + right
+        return nodes - self.leaves
+
+
+class ReplayBuffer:
+
+    def __init__(self, capacity, alpha=0.6, eps=1e-6, rng=None):
+        """'alpha' is the priority exponent (0 samples uniformly),
+           'eps' is added to priorities so that none is zero"""
+        self.capacity = capacity
+        self.alpha = alpha
+        self.eps = eps
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.boards = np.zeros(capacity, dtype=np.uint64)
+        self.directions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_boards = np.zeros(capacity, dtype=np.uint64)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.tree = SumTree(capacity) if alpha else None
+        self.max_priority = 1.
+        self.next = 0  # index of the next transition added
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add_batch(self, boards, directions, rewards, next_boards, dones, priorities=None):
+        """add N transitions given as arrays (boards packed in uint64);
+           without priorities, they get the max priority seen so far"""
+        n = len(boards)
+        if n > self.capacity:  # only the last ones would remain
+            cut = slice(n - self.capacity, n)
+            boards, directions, rewards, next_boards, dones = (
+                np.asarray(a)[cut] for a in (boards, directions, rewards, next_boards, dones))
+            if priorities is not None:
+                priorities = np.asarray(priorities)[cut]
+            self.next = (self.next + n - self.capacity) % self.capacity
+            n = self.capacity
+        indices = (self.next + np.arange(n)) % self.capacity
+        self.boards[indices] = boards
+        self.directions[indices] = directions
+        self.rewards[indices] = rewards
+        self.next_boards[indices] = next_boards
+        self.dones[indices] = dones
+        self.next = (self.next + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        if self.tree is not None:
+            if priorities is None:
+                priorities = np.full(n, self.max_priority)
+            self.update_priorities(indices, priorities)
+        return indices
+
+    def add(self, board, direction, reward, next_board, done, priority=None):
+        """add a transition, its boards being list-of-lists boards"""
+        return self.add_batch([bitboard.to_int(board)], [direction], [reward],
+                              [bitboard.to_int(next_board)], [done],
+                              None if priority is None else [priority])[0]
+
+    def update_priorities(self, indices, priorities):
+        """set the priorities of the transitions at 'indices' (no-op when
+           sampling uniformly)"""
+        if self.tree is None:
+            return
+        priorities = np.abs(np.asarray(priorities, dtype=np.float64)) + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def sample_indices(self, n):
+        """(indices, probabilities) of n transitions"""
+        if self.tree is None:
+            indices = self.rng.integers(self.size, size=n)
+            return indices, np.full(n, 1 / self.size)
+        total = self.tree.total()
+        # one draw in each of n equal segments of the total priority
+        values = (np.arange(n) + self.rng.random(n)) * (total / n)
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+        return indices, self.tree.get(indices) / total
+
+    def sample(self, n, beta=0.4):
+        """batch of n transitions: dict of arrays, with their 'indices' (for
+           update_priorities) and importance sampling 'weights' ** beta"""
+        assert self.size, "empty replay buffer"
+        indices, probabilities = self.sample_indices(n)
+        weights = (self.size * probabilities) ** -beta
+        return {'indices': indices,
+                'boards': self.boards[indices],
+                'directions': self.directions[indices],
+                'rewards': self.rewards[indices],
+                'next_boards': self.next_boards[indices],
+                'dones': self.dones[indices],
+                'weights': (weights / weights.max()).astype(np.float32)}
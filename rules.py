@@ -22,6 +22,18 @@ PERM = (ANTITRANS, # DOWN
         TRANSPOSE)  # UP
 
 
+def compose(p, q):
+    """permutation reading the board through 'p', then through 'q'"""
+    return tuple(tuple(p[i][j] for i, j in line) for line in q)
+
+
+FLIP = tuple(tuple((i, j) for j in range(SIZE)) for i in reversed(range(SIZE)))
+
+# the 8 symmetries of the square (rotations and reflections)
+SYMMETRIES = tuple(compose(p, t) for t in (IDENTITY, TRANSPOSE)
+                   for p in (IDENTITY, MIRROR, FLIP, compose(MIRROR, FLIP)))
+
+
 # A few predefined boards
 
 EMPTYBOARD = [[0] * SIZE for _ in range(SIZE)]
@@ -67,13 +79,16 @@ def is_full(board):
                 return False
     return True
 
-def slide_is_possible(board, i, perm=IDENTITY):
+def slide_is_possible(board, i, perm=None):
     """test whether a LEFT move_dir applied to line 'i' is possible 
-       on the 'board' permutated by 'perm'
+       on the 'board' permutated by 'perm' (IDENTITY of the current size
+       if None)
 
        contents follows the log convention:
        0 means "empty cell" and N>0 means "cell containing 2 ** N".
     """
+    if perm is None:
+        perm = IDENTITY
     
     for j in range(LAST):
     #-------------- Généralisation -----------------
@@ -96,18 +111,23 @@ def game_over(board):
        PRECONDITION: the board is not empty !
     """
     
-    return all([not move_dir_possible(direction, board) for direction in range(SIZE)])
+    return all([not move_dir_possible(direction, board) for direction in DIRECTIONS])
 
 
-def slide(in_board, out_board, i, perm=IDENTITY):
+def slide(in_board, out_board, i, perm=None, gain=None):
     """performs the slide inside board (for the same slide than in 
        slide_is_possible(board, i, perm)
        
     For example, if the line was initially [2, 2, 0, 0]
     then it becomes [3, 0, 0, 0].
 
+    If 'gain' is a list, the value 2 ** N of each new N tile
+    made by a merge is added to gain[0] (the usual 2048 score).
+
     Returns True iff 'board' has changed
     """
+    if perm is None:
+        perm = IDENTITY
     
     changement = False
 
@@ -121,6 +141,8 @@ def slide(in_board, out_board, i, perm=IDENTITY):
     while case <= LAST - 1:
         if ligne[case] != 0 and ligne[case] == ligne[case + 1]:
             ligne[case] += 1
+            if gain is not None:
+                gain[0] += 1 << ligne[case]
             ligne.pop(case + 1)
             ligne.append(0)
         case += 1
@@ -135,15 +157,33 @@ def slide(in_board, out_board, i, perm=IDENTITY):
     
     return changement
 
-def move_dir(direction, board):
+def move_dir(direction, board, gain=None):
     """Returns a board resulting from the slide of 'board'
        according to 'direction'.
        'board' remains unchanged.
        The resulting board 'res' satisfies 'res == board' iff 'res is board'
+       The merge score of the slide is added to 'gain' (see slide).
     """
     
     res = [line.copy() for line in board]
-    return res if any([slide(board, res, i, PERM[direction]) for i in range(SIZE)]) else board
+    return res if any([slide(board, res, i, PERM[direction], gain) for i in range(SIZE)]) else board
+
+
+def undo(board, record):
+    """restore the lines of 'board' changed by apply_dir (move_dir in place,
+       defined with the board sizes below) from its 'record'"""
+    perm = PERM[record[0]]
+    for k in range(1, len(record), 2):
+        for (i, j), v in zip(perm[record[k]], record[k + 1]):
+            board[i][j] = v
+
+
+def remove_tile(new_tile_move, board):
+    """undo move_tile(new_tile_move, board)"""
+    i, j, log2_value = new_tile_move
+    if board[i][j] != log2_value:
+        raise AssertionError
+    board[i][j] = 0
 
 def compte_horiz(board):
     score = 0
@@ -166,12 +206,127 @@ def compte_horiz(board):
       
     return score
 
+# compte_horiz of each line of 4 cells up to 15, the line being packed
+# as a | b << 4 | c << 8 | d << 12 (loaded on first use)
+_ROW_LEVEL = None
+
+
+def _row_level_words():
+    """row levels (up to 94 bits) as pairs of 64-bit words"""
+    for r in range(1 << 16):
+        v = compte_horiz([[r & 15, (r >> 4) & 15, (r >> 8) & 15, r >> 12]])
+        yield v & 0xFFFFFFFFFFFFFFFF
+        yield v >> 64
+
+
+def row_level_table():
+    global _ROW_LEVEL
+    if _ROW_LEVEL is None:
+        import tables  # disk cache, only needed here
+        words = tables.load('row_level', 'Q', _row_level_words, 4)
+        low, high = words[0::2], words[1::2]
+        _ROW_LEVEL = [a | (b << 64) for a, b in zip(low, high)]
+    return _ROW_LEVEL
+
+
+def row_key(line):
+    """index of 'line' in row_level_table(), or None if it has none"""
+    if len(line) == 4:
+        a, b, c, d = line
+        if (a | b | c | d) < 16:
+            return a | (b << 4) | (c << 8) | (d << 12)
+    return None
+
+
+def row_level(line):
+    """compte_horiz of the single line 'line'"""
+    key = row_key(line)
+    if key is None:
+        return compte_horiz([line])
+    return row_level_table()[key]
+
+
 def level(board):
+    if len(board) == 4:
+        table = _ROW_LEVEL or row_level_table()
+        dplc_h = 0
+        for a, b, c, d in board:
+            if (a | b | c | d) > 15:
+                break
+            dplc_h += table[a | (b << 4) | (c << 8) | (d << 12)]
+        else:
+            dplc_v = 0
+            for a, b, c, d in zip(*board):
+                dplc_v += table[a | (b << 4) | (c << 8) | (d << 12)]
+            return max(dplc_h, dplc_v)
+    # tiles above 2 ** 15, or board of another size
     dplc_h = compte_horiz(board)
     transpose = [list(elt) for elt in zip(*board)]
     return max(dplc_h, compte_horiz(transpose))
 
 
+class LevelTracker:
+    """level of 'board', kept up to date when its cells are changed through
+       set() or move_tile(), or when a line of 'board' is changed and
+       update_row() or update_col() is called."""
+
+    def __init__(self, board):
+        self.board = board
+        self.table = row_level_table()
+        self.row_keys = [None] * len(board)
+        self.col_keys = [None] * len(board)
+        self.rows = [0] * len(board)
+        self.cols = [0] * len(board)
+        self.horiz = self.vert = 0
+        for i in range(len(board)):
+            self.update_row(i)
+            self.update_col(i)
+
+    def value(self):
+        return max(self.horiz, self.vert)
+
+    def update_row(self, i):
+        line = self.board[i]
+        key = self.row_keys[i] = row_key(line)
+        old = self.rows[i]
+        self.rows[i] = compte_horiz([line]) if key is None else self.table[key]
+        self.horiz += self.rows[i] - old
+
+    def update_col(self, j):
+        line = [line[j] for line in self.board]
+        key = self.col_keys[j] = row_key(line)
+        old = self.cols[j]
+        self.cols[j] = compte_horiz([line]) if key is None else self.table[key]
+        self.vert += self.cols[j] - old
+
+    def set(self, i, j, log2_value):
+        """set cell (i, j) of the board to 'log2_value' (0 to empty it)"""
+        self.board[i][j] = log2_value
+        self.update_row(i)
+        self.update_col(j)
+
+    def move_tile(self, new_tile_move):
+        """same as rules.move_tile on the board"""
+        i, j, _ = new_tile_move
+        move_tile(new_tile_move, self.board)
+        self.update_row(i)
+        self.update_col(j)
+
+    def value_with(self, new_tile_move):
+        """level of the board with the new tile, which is not set on it"""
+        i, j, log2_value = new_tile_move
+        row, col = self.row_keys[i], self.col_keys[j]
+        if row is None or col is None or log2_value > 15:
+            self.set(i, j, log2_value)
+            res = self.value()
+            self.set(i, j, 0)
+            return res
+        table = self.table
+        horiz = self.horiz - table[row] + table[row | (log2_value << (4 * j))]
+        vert = self.vert - table[col] + table[col | (log2_value << (4 * i))]
+        return max(horiz, vert)
+
+
 def max_tile(board):
     """return the max tile on the board."""
 
@@ -190,6 +345,199 @@ def score(board):
     return 1 << res  # equiv to 2 ** res
 
 
+# -- Other board sizes
+# set_size(n) rebinds the size-dependent names below to those of n x n boards,
+# so that the functions of this module and the players follow. For sizes
+# other than 4, moves are generated functions with the lines unrolled, and
+# the slides of lines are cached in a per-size table, filled as they are met.
+# apply_dir is generated this way for every size, 4 included: the 4x4 one on
+# its first call, so that importing this module compiles nothing.
+
+ENGINE_NAMES = ('SIZE', 'LAST', 'IDENTITY', 'MIRROR', 'TRANSPOSE', 'ANTITRANS',
+                'PERM', 'FLIP', 'SYMMETRIES', 'EMPTYBOARD',
+                'move_dir', 'move_dir_possible', 'game_over', 'apply_dir')
+
+LINE_CACHE = 1 << 20  # most line slides kept by the table of a size
+
+_ENGINES = {}  # size -> {name of ENGINE_NAMES: its value for this size}
+
+
+def slide_line(line):
+    """(line after a LEFT slide, merge gain) of the tuple 'line'"""
+    cells = [v for v in line if v != 0]
+    res = []
+    gain = 0
+    k = 0
+    while k < len(cells):
+        if k + 1 < len(cells) and cells[k] == cells[k + 1]:
+            res.append(cells[k] + 1)
+            gain += 1 << (cells[k] + 1)
+            k += 2
+        else:
+            res.append(cells[k])
+            k += 1
+    res += [0] * (len(line) - len(res))
+    return tuple(res), gain
+
+
+def _engine_source(size, perms):
+    """source of the move functions of 'size', a line being unrolled
+       as a tuple of the cells of 'perms'"""
+    src = []
+    for d, perm in enumerate(perms):
+        src.append("def move_{0}(board, gain):".format(d))
+        src.append("    res = board")
+        for line in perm:
+            cells = ", ".join("board[{0}][{1}]".format(i, j) for i, j in line)
+            targets = ", ".join("res[{0}][{1}]".format(i, j) for i, j in line)
+            src.append("    line = ({0},)".format(cells))
+            src.append("    s = TABLE.get(line) or cached(line)")
+            src.append("    if s[0] is not None:")
+            src.append("        if res is board:")
+            src.append("            res = [l.copy() for l in board]")
+            src.append("        {0} = s[0]".format(targets))
+            src.append("        if gain is not None:")
+            src.append("            gain[0] += s[1]")
+        src.append("    return res")
+        src.append("def possible_{0}(board):".format(d))
+        names = ["a{0}".format(k) for k in range(size)]
+        test = " or ".join("({0} == 0 and {1} != 0) or ({0} == {1} != 0)".format(a, b)
+                           for a, b in zip(names, names[1:]))
+        for line in perm:
+            cells = ", ".join("board[{0}][{1}]".format(i, j) for i, j in line)
+            src.append("    {0} = {1}".format(", ".join(names), cells))
+            src.append("    if {0}:".format(test))
+            src.append("        return True")
+        src.append("    return False")
+        src.append("def apply_{0}(board, gain):".format(d))
+        src.append("    res = None")
+        for i, line in enumerate(perm):
+            cells = ", ".join("board[{0}][{1}]".format(i, j) for i, j in line)
+            src.append("    line = ({0},)".format(cells))
+            src.append("    s = TABLE.get(line) or cached(line)")
+            src.append("    if s[0] is not None:")
+            src.append("        {0} = s[0]".format(cells))
+            src.append("        if res is None:")
+            src.append("            res = [{0}]".format(d))
+            src.append("        res += ({0}, line)".format(i))
+            src.append("        if gain is not None:")
+            src.append("            gain[0] += s[1]")
+        src.append("    return res")
+    return "\n".join(src)
+
+
+def _engine_functions(size, perms):
+    """{name: generated function} of the moves of 'size'"""
+    table = {}  # line -> (line after the slide or None if unchanged, gain)
+
+    def cached(line):
+        if len(table) >= LINE_CACHE:
+            table.clear()
+        res, gain = slide_line(line)
+        s = table[line] = (None if res == line else res, gain)
+        return s
+
+    namespace = {'TABLE': table, 'cached': cached}
+    exec(compile(_engine_source(size, perms), "<rules {0}x{0}>".format(size), 'exec'),
+         namespace)
+    moves = tuple(namespace['move_{0}'.format(d)] for d in DIRECTIONS)
+    possibles = tuple(namespace['possible_{0}'.format(d)] for d in DIRECTIONS)
+    applies = tuple(namespace['apply_{0}'.format(d)] for d in DIRECTIONS)
+
+    def sized_apply_dir(direction, board, gain=None):
+        """slide 'board' in place according to 'direction'.
+           Returns None if 'board' has not changed, else the record of the
+           lines changed, to be given to undo(). The merge score of the
+           slide is added to 'gain' (see slide)."""
+        return applies[direction](board, gain)
+
+    def sized_move_dir(direction, board, gain=None):
+        return moves[direction](board, gain)
+
+    def sized_move_dir_possible(direction, board):
+        return possibles[direction](board)
+
+    def sized_game_over(board):
+        for possible in possibles:
+            if possible(board):
+                return False
+        return True
+
+    for f, g in ((sized_move_dir, move_dir),
+                 (sized_move_dir_possible, move_dir_possible),
+                 (sized_game_over, game_over)):
+        f.__name__ = f.__qualname__ = g.__name__
+        f.__doc__ = g.__doc__
+    sized_apply_dir.__name__ = sized_apply_dir.__qualname__ = 'apply_dir'
+    return {'move_dir': sized_move_dir, 'move_dir_possible': sized_move_dir_possible,
+            'game_over': sized_game_over, 'apply_dir': sized_apply_dir}
+
+
+def _build_engine(size):
+    last = size - 1
+    identity = tuple(tuple((i, j) for j in range(size)) for i in range(size))
+    mirror = tuple(tuple((i, j) for j in reversed(range(size))) for i in range(size))
+    transpose = tuple(tuple((j, i) for j in range(size)) for i in range(size))
+    antitrans = tuple(tuple((j, i) for j in reversed(range(size)))
+                      for i in reversed(range(size)))
+    perms = (antitrans, identity, mirror, transpose)  # as PERM
+    flip = tuple(tuple((i, j) for j in range(size)) for i in reversed(range(size)))
+    symmetries = tuple(compose(p, t) for t in (identity, transpose)
+                       for p in (identity, mirror, flip, compose(mirror, flip)))
+    res = {'SIZE': size, 'LAST': last, 'IDENTITY': identity, 'MIRROR': mirror,
+           'TRANSPOSE': transpose, 'ANTITRANS': antitrans, 'PERM': perms,
+           'FLIP': flip, 'SYMMETRIES': symmetries,
+           'EMPTYBOARD': [[0] * size for _ in range(size)]}
+    res.update(_engine_functions(size, perms))
+    return res
+
+
+def engine(size):
+    """{name of ENGINE_NAMES: its value} for boards of 'size' x 'size'"""
+    res = _ENGINES.get(size)
+    if res is None:
+        if size < 2:
+            raise ValueError("board size {0} is below 2".format(size))
+        res = _ENGINES[size] = _build_engine(size)
+    return res
+
+
+def set_size(size):
+    """play on boards of 'size' x 'size' from now on, in this process"""
+    if size != SIZE:
+        globals().update(engine(size))
+
+
+def start_board(board):
+    """'board', or the empty board of SIZE for an empty board of another size"""
+    if len(board) != SIZE:
+        if max_tile(board) != 0:
+            raise ValueError("board of size {0} played on boards of size {1}".format(
+                len(board), SIZE))
+        return EMPTYBOARD
+    return board
+
+
+_APPLY_DIR = []  # generated apply_dir of 4x4 boards, once built
+
+
+def apply_dir(direction, board, gain=None):
+    """slide 'board' in place according to 'direction' (see the generated
+       function, which replaces this one on its first call)"""
+    if not _APPLY_DIR:
+        res = _engine_functions(4, _ENGINES[4]['PERM'])['apply_dir']
+        _APPLY_DIR.append(res)
+        _ENGINES[4]['apply_dir'] = res
+        if globals()['apply_dir'] is _lazy_apply_dir:
+            globals()['apply_dir'] = res
+    return _APPLY_DIR[0](direction, board, gain)
+
+
+_lazy_apply_dir = apply_dir  # 4x4 moves stay as above
+
+_ENGINES[SIZE] = {name: globals()[name] for name in ENGINE_NAMES}
+
+
 # -- Example of observer for play2048 below
 # This function is blocking for play2048
 # For example:
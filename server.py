@@ -0,0 +1,267 @@
+#! /usr/bin/env python3
+"""
+Decision server: players of '2048' served to many games from one process.
+
+The protocol is line-delimited JSON over TCP (config.SERVER_ADDRESS):
+  request:  {"id": any, "kind": "direction" or "tile", "board": board}
+  response: {"id": same, "move": direction or [i, j, log2_value]}
+            or {"id": same, "error": message}
+and {"kind": "stats"} returns the latency statistics of the server.
+
+Concurrent requests of a kind, from any connection, are gathered into
+micro-batches of at most config.SERVER_MAX_BATCH boards, waiting at most
+config.SERVER_MAX_WAIT milliseconds after the first one. A batch is
+evaluated by the 'batch' attribute of the player if it has one (a function
+of a list of boards returning the list of their moves), else board by board.
+A board is checked before it joins a batch, and a failure of the batch is
+narrowed down board by board: an error only fails its own request.
+Batches are evaluated one at a time, in a thread of their own: players
+share state (such as the table of the coop players) and are not
+thread-safe.
+
+    python3 server.py -d basic_coop_direction -t random_tile
+
+players.remote_direction and players.remote_tile are clients of this server.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rules
+import config
+import cli
+import instrument
+
+
+def check_board(kind, board):
+    """raise ValueError if 'board' is no board of rules.SIZE on which the
+       player of 'kind' can play"""
+    if not (isinstance(board, list) and len(board) == rules.SIZE
+            and all(isinstance(line, list) and len(line) == rules.SIZE
+                    and all(type(v) is int and v >= 0 for v in line)
+                    for line in board)):
+        raise ValueError("not a {0}x{0} board of log2 values".format(rules.SIZE))
+    if kind == 'direction' and rules.game_over(board):
+        raise ValueError("no direction can be played")
+    if kind == 'tile' and rules.is_full(board):
+        raise ValueError("no empty cell")
+
+
+def batch_evaluator(player):
+    batch = getattr(player, 'batch', None)
+    if batch is not None:
+        return batch
+    return lambda boards: [player(board) for board in boards]
+
+
+class Batcher:
+    """evaluates the boards submitted concurrently in micro-batches,
+       in the threads of 'executor' (None for the default one of asyncio)"""
+
+    def __init__(self, player, max_batch, max_wait, executor=None):
+        self.evaluate = batch_evaluator(player)
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait / 1000
+        self.queue = asyncio.Queue()
+        self.sizes = instrument.Histogram()  # batch sizes, counted as seconds
+
+    async def submit(self, board):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((board, future))
+        return await future
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            self.sizes.add(len(batch))
+            boards = [board for board, _ in batch]
+            try:
+                # in a thread: requests keep on being read meanwhile
+                moves = await loop.run_in_executor(self.executor, self.evaluate, boards)
+            except Exception:
+                # board by board, so that the faulty one alone fails
+                for board, future in batch:
+                    try:
+                        move, = await loop.run_in_executor(self.executor,
+                                                           self.evaluate, [board])
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    if not future.done():
+                        future.set_result(move)
+                continue
+            for (_, future), move in zip(batch, moves):
+                if not future.done():
+                    future.set_result(move)
+
+
+class Server:
+
+    def __init__(self, direction_player, tile_player,
+                 max_batch=None, max_wait=None):
+        if max_batch is None:
+            max_batch = config.SERVER_MAX_BATCH
+        if max_wait is None:
+            max_wait = config.SERVER_MAX_WAIT
+        # a single thread: a batch of a kind never runs along one of the other
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batchers = {'direction': Batcher(direction_player, max_batch, max_wait,
+                                              self.executor),
+                         'tile': Batcher(tile_player, max_batch, max_wait, self.executor)}
+        self.latency = {kind: instrument.Histogram() for kind in self.batchers}
+
+    def stats(self):
+        res = {}
+        for kind, batcher in self.batchers.items():
+            res[kind] = {'latency': self.latency[kind].summary(),
+                         'batch size': batcher.sizes.summary()}
+            del res[kind]['batch size']['buckets']
+        return res
+
+    async def answer(self, line, writer):
+        start = time.perf_counter()
+        request = {}
+        try:
+            request = json.loads(line)
+            kind = request['kind']
+            if kind == 'stats':
+                response = {'stats': self.stats()}
+            else:
+                batcher = self.batchers[kind]
+                check_board(kind, request['board'])
+                move = await batcher.submit(request['board'])
+                response = {'move': move}
+                self.latency[kind].add(time.perf_counter() - start)
+        except Exception as e:
+            response = {'error': "{0}: {1}".format(type(e).__name__, e)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        writer.write(json.dumps(response).encode() + b'\n')
+
+    async def handle(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address=None):
+        host, port = address or config.SERVER_ADDRESS
+        runners = [asyncio.create_task(b.run()) for b in self.batchers.values()]
+        server = await asyncio.start_server(self.handle, host, port)
+        print("serving on {0}:{1}".format(host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for runner in runners:
+                runner.cancel()
+            self.executor.shutdown(wait=False)
+
+
+# ---------------------------
+# client
+
+
+class Client:
+    """blocking client of the server, for one game at a time"""
+
+    def __init__(self, address=None):
+        self.socket = socket.create_connection(address or config.SERVER_ADDRESS)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, request):
+        self.file.write(json.dumps(request).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("decision server closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def direction(self, board):
+        return self.request({'kind': 'direction', 'board': board})['move']
+
+    def tile(self, board):
+        move = self.request({'kind': 'tile', 'board': board})['move']
+        return None if move is None else tuple(move)
+
+    def stats(self):
+        return self.request({'kind': 'stats'})['stats']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+_client = None
+
+
+def client():
+    """client of this process (a forked process gets its own connection)"""
+    global _client
+    if _client is None or _client.pid != os.getpid():
+        _client = Client()
+        _client.pid = os.getpid()
+    return _client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-d', '--direction', default='basic_coop_direction',
+                        help="direction player served: name in players.py or module.name")
+    parser.add_argument('-t', '--tile', default='random_tile',
+                        help="tile player served: name in players.py or module.name")
+    parser.add_argument('--max-batch', type=int, default=config.SERVER_MAX_BATCH)
+    parser.add_argument('--max-wait', type=float, default=config.SERVER_MAX_WAIT,
+                        help="milliseconds")
+    args = parser.parse_args()
+    server = Server(cli.resolve(args.direction), cli.resolve(args.tile),
+                    args.max_batch, args.max_wait)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), indent=2))
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Streaming statistics of games for mean_score, and sequential stopping
+
+Statistics are updated game by game (Welford's algorithm for means and
+variances), so that a run can be stopped as soon as it is conclusive:
+  - once the confidence interval of the mean of a metric is narrower than
+    a target width,
+  - or once a baseline player, playing the same seeded games, is shown
+    better or worse (confidence interval of the paired differences not
+    containing 0).
+Intervals use the normal approximation, but for proportions (p2048): they
+use the Wilson score interval, which keeps a width when no game or every
+game reaches 2048, and may stop a run on its own. Other samples of zero
+variance (a normal interval of width 0) never stop a run.
+Statistics are fed in the order of the game numbers (see mean_score), so
+that the stopped sample does not depend on which games end first.
+NB: testing after every game makes the actual error rate higher than
+1 - confidence; MIN_GAMES limits this.
+"""
+
+from collections import Counter
+from statistics import NormalDist
+
+# metric of a game (max tile, number of moves)
+METRICS = {'max_tile': lambda tile, moves: tile,
+           'moves': lambda tile, moves: moves,
+           'p2048': lambda tile, moves: float(tile >= 2048)}
+PROPORTIONS = {'p2048'}  # metrics of value 0 or 1
+
+
+class Welford:
+    """running mean and variance"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self.m2 = 0.  # sum of the squared deviations to the mean
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.
+
+    def sem(self):
+        """standard error of the mean"""
+        return (self.variance() / self.n) ** 0.5 if self.n else float('inf')
+
+    def interval(self, confidence):
+        """confidence interval of the mean"""
+        half = z_value(confidence) * self.sem()
+        return self.mean - half, self.mean + half
+
+
+def z_value(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def wilson_interval(p, n, confidence):
+    """Wilson score interval of a proportion 'p' observed on 'n' games"""
+    if not n:
+        return 0., 1.
+    z2 = z_value(confidence) ** 2
+    center = (p + z2 / (2 * n)) / (1 + z2 / n)
+    half = (z2 * (p * (1 - p) / n + z2 / (4 * n * n))) ** 0.5 / (1 + z2 / n)
+    return max(0., center - half), min(1., center + half)
+
+
+class GameStats:
+
+    def __init__(self):
+        self.metrics = {name: Welford() for name in METRICS}
+        self.tiles = Counter()  # max tile -> number of games
+
+    def add(self, tile, moves):
+        for name, metric in METRICS.items():
+            self.metrics[name].add(metric(tile, moves))
+        self.tiles[tile] += 1
+
+    def interval(self, name, confidence):
+        """confidence interval of the mean of the metric 'name'"""
+        w = self.metrics[name]
+        if name in PROPORTIONS:
+            return wilson_interval(w.mean, w.n, confidence)
+        return w.interval(confidence)
+
+    def report(self, confidence):
+        n = self.metrics['max_tile'].n
+        print("MAX TILE HISTOGRAM:", " -- ".join(
+            "{0}: {1}".format(tile, self.tiles[tile] / n) for tile in sorted(self.tiles)))
+        for name, label in (('max_tile', "MEAN MAX TILE"),
+                            ('moves', "MEAN TILE NUMBER"),
+                            ('p2048', "PROBA >= 2048")):
+            w = self.metrics[name]
+            lo, hi = self.interval(name, confidence)
+            print("{0}: {1:.4g} -- STDEV: {2:.4g} -- {3:.0%} INTERVAL: [{4:.4g}, {5:.4g}]".format(
+                label, w.mean, w.variance() ** 0.5, confidence, lo, hi))
+
+
+class Stopper:
+    """sequential stopping rule on 'metric' (a key of METRICS)"""
+
+    def __init__(self, metric, confidence, width=None, min_games=30):
+        self.metric = METRICS[metric]
+        self.name = metric
+        self.confidence = confidence
+        self.width = width
+        self.min_games = min_games
+        self.diffs = Welford()  # paired differences with the baseline
+        self.reason = None
+
+    def add_pair(self, game, baseline):
+        """add the paired results (tile, moves) of a game and its baseline game"""
+        self.diffs.add(self.metric(*game) - self.metric(*baseline))
+
+    def stop(self, stats):
+        """whether the run can stop, after the games of 'stats'"""
+        w = stats.metrics[self.name]
+        if w.n < self.min_games:
+            return False
+        if self.width is not None and (self.name in PROPORTIONS or w.variance() > 0):
+            lo, hi = stats.interval(self.name, self.confidence)
+            if hi - lo <= self.width:
+                self.reason = "{0} interval narrower than {1}".format(self.name, self.width)
+                return True
+        if self.diffs.n >= self.min_games and self.diffs.variance() > 0:
+            lo, hi = self.diffs.interval(self.confidence)
+            if lo > 0 or hi < 0:
+                self.reason = "{0} {1} than the baseline: difference in [{2:.4g}, {3:.4g}]".format(
+                    self.name, "higher" if lo > 0 else "lower", lo, hi)
+                return True
+        return False
@@ -0,0 +1,107 @@
+"""Disk cache of the precomputed tables of rules and bitboard
+
+A table is a list of ints computed once by a build function, then stored
+in a binary file of the cache directory: a header (MAGIC, the key of the
+table and its number of items) followed by the table as a C array. A file
+whose body does not hold this number of items (cut short by a killed run,
+say) is rebuilt. Other processes, and later
+runs, memory-map this file and copy the table into a list instead of
+building it again. Sharing was traded for lookup speed: lists are the
+fastest to index from Python (items of an array or memoryview of the
+mapping are 10 to 25% slower to read in the loops of bitboard), but each
+process holds its own copy, about 11 MB for the tables of bitboard.
+Nothing is read before the first use of a table (see bitboard.load_tables).
+
+The key of a table hashes its name, its item type, the board size and
+VERSION: bump VERSION when the content of a table changes.
+The cache directory is $TABLES_CACHE, or __pycache__ beside this file.
+If it is not writable, tables are built in memory at each run.
+"""
+
+import hashlib
+import mmap
+import os
+import sys
+from array import array
+
+VERSION = 2
+MAGIC = b'2048tbl\n'
+KEY_END = len(MAGIC) + 32  # magic + sha256 key
+HEADER = KEY_END + 8  # + number of items
+
+DIRECTORY = os.environ.get('TABLES_CACHE') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+_TABLES = {}  # (name, size) -> table loaded by this process
+
+
+def key(name, typecode, size):
+    """sha256 digest identifying the format of a table"""
+    text = "{0}:{1}:{2}:{3}:{4}:{5}".format(
+        VERSION, name, typecode, array(typecode).itemsize, size, sys.byteorder)
+    return hashlib.sha256(text.encode()).digest()
+
+
+def path(name, typecode, size):
+    return os.path.join(DIRECTORY, "{0}-{1}x{1}-{2}.table".format(
+        name, size, key(name, typecode, size).hex()[:16]))
+
+
+def read(name, typecode, size):
+    """the table stored in the cache, as a list (see above), or None"""
+    try:
+        with open(path(name, typecode, size), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if m[:KEY_END] != MAGIC + key(name, typecode, size):
+                    return None
+                count = int.from_bytes(m[KEY_END:HEADER], 'little')
+                if len(m) - HEADER != count * array(typecode).itemsize:
+                    return None
+                with memoryview(m) as view:
+                    with view[HEADER:] as data:
+                        with data.cast(typecode) as items:
+                            return items.tolist()
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def write(name, typecode, size, table):
+    """store 'table' in the cache (the file appears at once, complete)"""
+    target = path(name, typecode, size)
+    tmp = "{0}.{1}.tmp".format(target, os.getpid())
+    try:
+        os.makedirs(DIRECTORY, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + key(name, typecode, size) + len(table).to_bytes(8, 'little'))
+            array(typecode, table).tofile(f)
+        os.replace(tmp, target)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load(name, typecode, build, size):
+    """the table 'name' of boards of 'size', of items of type 'typecode'
+       (see the array module), read from the cache or else built by build()"""
+    res = _TABLES.get((name, size))
+    if res is None:
+        res = read(name, typecode, size)
+        if res is None:
+            res = list(build())
+            write(name, typecode, size, res)
+        _TABLES[(name, size)] = res
+    return res
+
+
+def clear():
+    """remove the cached files of all the tables"""
+    _TABLES.clear()
+    try:
+        names = os.listdir(DIRECTORY)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith('.table'):
+            os.remove(os.path.join(DIRECTORY, name))
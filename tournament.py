@@ -0,0 +1,247 @@
+#! /usr/bin/env python3
+"""
+Tournament between the players: every tile player against every direction
+player, on the same seeded games.
+
+Players are the tile and direction players of players.py, and any player
+given as module.name (or module:name). Game k from a start board uses the
+seed mean_score.game_seed(seed, k) whatever the pairing. Games run on a
+process pool, and their results are cached on disk under a key made of the
+identity and code hash of both players, the seed and the start board: after
+a player has changed, only its games are played again (all of them after a
+change of the engine playing the games).
+
+    python3 tournament.py --games 50 --workers 4
+    python3 tournament.py -t random_tile -d mymodule.my_direction
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import types
+
+import rules
+import config
+import cli
+import players
+import mean_score
+
+# players left out by default: anytime_direction and montecarlo_direction
+# take their budgets, ntuple_direction needs a weight file, remote players
+# a running server.py
+EXCLUDED = ('anytime_direction', 'montecarlo_direction', 'ntuple_direction',
+            'remote_direction', 'remote_tile')
+
+BOARDS = ('EMPTYBOARD', 'STEP0', 'XFULLBOARD')  # start boards of rules
+
+CACHE = '.tournament-cache.jsonl'
+
+# modules playing the games of every player: a change of their source
+# changes the code hash of all the players
+ENGINE_MODULES = ('rules', 'bitboard', 'transposition', 'tables', 'mean_score')
+_ENGINE_HASH = None
+
+
+# ---------------------------
+# players
+
+
+def player_names(kind):
+    """names of the players of players.py of 'kind' ('tile' or 'direction')"""
+    return sorted(name for name, f in vars(players).items()
+                  if isinstance(f, types.FunctionType) and f.__module__ == 'players'
+                  and name.endswith('_' + kind) and name not in EXCLUDED)
+
+
+def _code(code, digest):
+    digest.update(code.co_code)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            _code(c, digest)
+        elif isinstance(c, frozenset):  # its repr depends on the hash seed
+            digest.update(repr(sorted(map(repr, c))).encode())
+        else:
+            digest.update(repr(c).encode())
+    digest.update(repr(code.co_names).encode())
+
+
+def engine_hash():
+    """hash of the source of ENGINE_MODULES (read once, without importing them)"""
+    global _ENGINE_HASH
+    if _ENGINE_HASH is None:
+        digest = hashlib.sha256()
+        for name in ENGINE_MODULES:
+            with open(importlib.util.find_spec(name).origin, 'rb') as f:
+                digest.update(f.read())
+        _ENGINE_HASH = digest.hexdigest()
+    return _ENGINE_HASH
+
+
+def code_hash(f):
+    """hash of the code of function 'f', of the functions and classes of its
+       module it uses (recursively), of the config values it reads, and of
+       the engine (see ENGINE_MODULES)"""
+    digest = hashlib.sha256()
+    digest.update(engine_hash().encode())
+    seen = set()
+    todo = [f]
+    while todo:
+        g = todo.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        if isinstance(g, type):
+            todo.extend(v for v in vars(g).values() if isinstance(v, types.FunctionType))
+            continue
+        code = g.__code__
+        _code(code, digest)
+        names = set(code.co_names)
+        for c in code.co_consts:  # names used by nested functions
+            if isinstance(c, types.CodeType):
+                names.update(c.co_names)
+        for name in sorted(names):
+            v = g.__globals__.get(name)
+            if isinstance(v, (types.FunctionType, type)) and v.__module__ == f.__module__:
+                todo.append(v)
+            elif name.isupper() and name in g.__globals__:  # constant of its module
+                digest.update("{0}={1!r}".format(name, v).encode())
+            elif name.isupper() and hasattr(config, name):
+                digest.update("{0}={1!r}".format(name, getattr(config, name)).encode())
+    return digest.hexdigest()
+
+
+def identity(spec):
+    f = cli.resolve(spec)
+    return "{0}.{1}:{2}".format(f.__module__, f.__qualname__, code_hash(f))
+
+
+# ---------------------------
+# games and cache
+
+
+def game_key(tile_id, direction_id, seed, board):
+    text = json.dumps([tile_id, direction_id, seed, board, config.FIRST_PLAYER])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def play(task):
+    """(key, max tile, number of moves) of a task (key, tile, direction, seed, board)"""
+    key, tile, direction, seed, board = task
+    random.seed(seed)
+    players.new_game()
+    game = mean_score.GAMES[0][config.FIRST_PLAYER]
+    ss, nn = game(cli.resolve(direction), cli.resolve(tile), board)
+    return key, ss, nn
+
+
+def load_cache(path):
+    res = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # line cut by a killed run
+                    continue
+                res[entry['key']] = (entry['tile'], entry['moves'])
+    return res
+
+
+def tournament(tiles, directions, boards, games, seed, workers, cache_path=CACHE):
+    """{(tile, direction): [(max tile, number of moves)]} over the games
+       of each start board"""
+    ids = {spec: identity(spec) for spec in set(tiles) | set(directions)}
+    cache = load_cache(cache_path)
+    keys = {}  # (tile, direction) -> keys of its games
+    tasks = []
+    for tile in tiles:
+        for direction in directions:
+            keys[tile, direction] = []
+            for name in boards:
+                board = getattr(rules, name)
+                for k in range(games):
+                    s = mean_score.game_seed(seed, k)
+                    key = game_key(ids[tile], ids[direction], s, board)
+                    keys[tile, direction].append(key)
+                    if key not in cache:
+                        tasks.append((key, tile, direction, s, board))
+    # a same key may be asked by two pairings (same players under two names)
+    tasks = list({task[0]: task for task in tasks}.values())
+    sys.stderr.write("{0} games cached, {1} to play\n".format(
+        sum(len(v) for v in keys.values()) - len(tasks), len(tasks)))
+    if tasks:
+        with open(cache_path, 'a') as out:
+            if workers > 1:
+                pool = multiprocessing.Pool(workers)
+                results = pool.imap_unordered(play, tasks, config.CHUNK_SIZE)
+            else:
+                pool = None
+                results = map(play, tasks)
+            last = time.time()
+            for done, (key, ss, nn) in enumerate(results, 1):
+                cache[key] = (ss, nn)
+                out.write(json.dumps({'key': key, 'tile': ss, 'moves': nn}) + '\n')
+                if done == len(tasks) or time.time() - last >= config.PROGRESS_PERIOD:
+                    out.flush()
+                    sys.stderr.write("\rfinished games: {0}/{1}".format(done, len(tasks)))
+                    sys.stderr.flush()
+                    last = time.time()
+            sys.stderr.write("\n")
+            if pool is not None:
+                pool.close()
+                pool.join()
+    return {pair: [cache[key] for key in pair_keys] for pair, pair_keys in keys.items()}
+
+
+def report(results, tiles, directions):
+    width = max(len(d) for d in directions + ['MEAN MAX TILE'])
+    first = max(len(t) for t in tiles)
+    print(" " * first, " ".join(d.rjust(width) for d in directions))
+    for tile in tiles:
+        cells = []
+        for direction in directions:
+            res = results[tile, direction]
+            cells.append("{0:.1f}".format(sum(ss for ss, _ in res) / len(res)).rjust(width))
+        print(tile.ljust(first), " ".join(cells))
+    print("(mean max tile, over {0} games per pairing)".format(
+        len(next(iter(results.values())))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-t', '--tile', action='append', default=[],
+                        help="tile player (repeatable; default: all of players.py)")
+    parser.add_argument('-d', '--direction', action='append', default=[],
+                        help="direction player (repeatable; default: all of players.py)")
+    parser.add_argument('-b', '--board', action='append', choices=BOARDS,
+                        help="start board of rules (repeatable; default: EMPTYBOARD)")
+    parser.add_argument('--games', type=int, default=config.GAMES_NUMBER,
+                        help="games per start board and pairing")
+    parser.add_argument('--seed', type=int,
+                        default=config.SEED if config.SEED is not None else 0)
+    parser.add_argument('--workers', type=int, default=config.WORKERS or os.cpu_count())
+    parser.add_argument('--cache', default=CACHE, help="result cache file")
+    parser.add_argument('-o', '--output', help="JSON file of all the results")
+    args = parser.parse_args()
+
+    tiles = args.tile or player_names('tile')
+    directions = args.direction or player_names('direction')
+    boards = args.board or ['EMPTYBOARD']
+    results = tournament(tiles, directions, boards, args.games, args.seed,
+                         args.workers, args.cache)
+    report(results, tiles, directions)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{'tile': t, 'direction': d, 'results': res}
+                       for (t, d), res in results.items()], f, indent=1)
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    main()
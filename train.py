@@ -0,0 +1,197 @@
+#! /usr/bin/env python3
+"""Parallel training of the n-tuple network of ntuple.py
+
+Worker processes play games against players.random_tile and learn from
+them (ntuple.NTupleNetwork.learn_game) on the same weights: a memory-mapped
+working file, updated without any lock ("Hogwild"). The main process
+  - evaluates the current weights every 'eval_period' seconds, with the
+    statistics of mean_score,
+  - writes a checkpoint every 'checkpoint_period' seconds, and at the end:
+    the weights (.npy) followed by the state of the training (JSON, ignored
+    by np.load), written to a temporary file which then replaces the
+    checkpoint: weights and state are always of the same games,
+  - reports the games per hour of the workers.
+Training resumes from the checkpoint when it exists, from 0 games for
+weights without a state (such as the ones of ntuple.py).
+
+    python3 train.py -w ntuple.npy --workers 4 --games 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from multiprocessing import Event, Process, RawArray
+
+import numpy as np
+
+import rules
+import config
+import players
+import ntuple
+import mean_score
+
+
+def worker_loop(worker, path, alpha, seed, games, scores, stop):
+    if seed is not None:
+        random.seed("{0}:{1}".format(seed, worker))
+    net = ntuple.load(path, writable=True)
+    try:
+        while not stop.is_set():
+            score, _, _ = net.learn_game(alpha)
+            games[worker] += 1  # only this worker writes its own slot
+            scores[worker] += score
+    except KeyboardInterrupt:
+        pass
+
+
+def evaluate(net, games):
+    """mean_score statistics of 'games' games of the network's direction
+       against players.random_tile"""
+    tiles, moves = [], []
+    for _ in range(games):
+        tile, n = mean_score.game_tile_first(net.direction, players.random_tile,
+                                             rules.EMPTYBOARD)
+        tiles.append(tile)
+        moves.append(n)
+    best, worst = max(tiles), min(tiles)
+    return {'games': games,
+            'mean max tile': sum(tiles) / games,
+            'mean tile number': sum(moves) / games,
+            'max of max tile': best,
+            'proba max': tiles.count(best) / games,
+            'min of max tile': worst,
+            'proba min': tiles.count(worst) / games,
+            'proba 2048': sum(t >= 2048 for t in tiles) / games}
+
+
+def atomic_write(path, write):
+    """call write(f) on a temporary file which then replaces 'path'"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def checkpoint(path, net, state):
+    def write(f):
+        np.save(f, net.weights)
+        f.write(json.dumps(state, indent=2).encode())
+    atomic_write(path, write)
+
+
+def new_state():
+    return {'games': 0, 'seconds': 0., 'evaluations': []}
+
+
+def read_state(path):
+    """state of the training written after the weights of the file 'path',
+       a new state if there is none"""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        f.seek(int(np.prod(shape)) * dtype.itemsize, os.SEEK_CUR)
+        data = f.read()
+    if data:
+        return json.loads(data)
+    if os.path.exists(path + '.json'):  # checkpoint of a previous version
+        with open(path + '.json') as f:
+            return json.load(f)
+    return new_state()
+
+
+def resume(path, work):
+    """copy the checkpoint 'path' (or zero weights) to the working file 'work'.
+       Returns the state of the checkpoint"""
+    if os.path.exists(path):
+        shutil.copyfile(path, work)
+        return read_state(path)
+    ntuple.create(work).weights.flush()
+    return new_state()
+
+
+def train(path, workers, games, alpha=ntuple.ALPHA, seed=None,
+          eval_games=100, eval_period=600, checkpoint_period=600):
+    work = path + '.work.npy'
+    state = resume(path, work)
+    net = ntuple.load(work)
+    done = RawArray('q', workers)
+    scores = RawArray('q', workers)
+    stop = Event()
+    processes = [Process(target=worker_loop,
+                         args=(w, work, alpha, seed, done, scores, stop),
+                         daemon=True)
+                 for w in range(workers)]
+    for p in processes:
+        p.start()
+    start = time.time()
+    last_eval = last_checkpoint = start
+    first, seconds = state['games'], state['seconds']
+
+    def update_state():
+        state['games'] = first + sum(done)
+        state['seconds'] = seconds + time.time() - start
+
+    try:
+        while first + sum(done) < games:
+            time.sleep(min(1., eval_period, checkpoint_period))
+            now = time.time()
+            if now - last_eval >= eval_period:
+                stats = evaluate(net, eval_games)
+                update_state()
+                stats['trained games'] = state['games']
+                state['evaluations'].append(stats)
+                print("games: {0} -- {1:.0f} games/hour -- mean score of training: {2:.0f}".format(
+                    state['games'], sum(done) / (now - start) * 3600,
+                    sum(scores) / max(1, sum(done))))
+                print("MEAN MAX TILE:{0} -- MEAN TILE NUMBER: {1} -- PROBA 2048: {2}".format(
+                    stats['mean max tile'], stats['mean tile number'], stats['proba 2048']))
+                sys.stdout.flush()
+                last_eval = time.time()
+            if now - last_checkpoint >= checkpoint_period:
+                update_state()
+                checkpoint(path, net, state)
+                last_checkpoint = time.time()
+    except KeyboardInterrupt:
+        print("interrupted")
+    finally:
+        stop.set()
+        for p in processes:
+            p.join()
+        update_state()
+        checkpoint(path, net, state)
+        os.remove(work)
+    elapsed = time.time() - start
+    print("TOTAL TIME:", elapsed, "-- GAMES:", sum(done),
+          "-- GAMES PER HOUR:", sum(done) / elapsed * 3600)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-w', '--weights', default=config.NTUPLE_WEIGHTS,
+                        help="checkpoint file (default: config.NTUPLE_WEIGHTS)")
+    parser.add_argument('--workers', type=int, default=config.WORKERS or os.cpu_count())
+    parser.add_argument('--games', type=int, default=config.GAMES_NUMBER,
+                        help="total number of training games, checkpoint included")
+    parser.add_argument('--alpha', type=float, default=ntuple.ALPHA)
+    parser.add_argument('--seed', type=int, default=config.SEED)
+    parser.add_argument('--eval-games', type=int, default=100)
+    parser.add_argument('--eval-period', type=float, default=600, help="seconds")
+    parser.add_argument('--checkpoint-period', type=float, default=600, help="seconds")
+    args = parser.parse_args()
+    train(args.weights, args.workers, args.games, args.alpha, args.seed,
+          args.eval_games, args.eval_period, args.checkpoint_period)
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Compact binary records of games, and their streaming reader
+
+A ply is 10 bytes: the board before the ply packed in 8 bytes (see
+bitboard.py), the player (0 for TILE, 1 for DIRECTION, as in play2048)
+and its move: a direction, or a tile (i, j, log2_value) packed as
+(SIZE * i + j) << 1 | (log2_value - 1).
+
+A file is a header, then chunks of whole games, then an index of the games:
+
+  header: MAGIC, version, compression (0: none, else zlib level)
+  chunk:  raw size, stored size, number of games (3 x uint32), then the
+          data, compressed or not: for each game its id (uint64) and number
+          of plies (uint32), then the plies of all the games
+  index:  for each game: offset of its chunk, rank of its first ply in the
+          chunk, number of plies, id
+  footer: offset of the index, number of games, END
+
+A file missing its index (a run which was killed) is read by scanning its
+chunks, and a Writer appends to an existing file.
+"""
+
+import os
+import struct
+import zlib
+
+import rules
+
+MAGIC = b'2048rec\n'
+END = b'2048end\n'
+VERSION = 1
+
+HEADER = struct.Struct('<8sBB')
+CHUNK = struct.Struct('<III')
+GAME = struct.Struct('<QI')
+PLY = struct.Struct('<QBB')
+ENTRY = struct.Struct('<QIIQ')
+FOOTER = struct.Struct('<QQ8s')
+
+TILE, DIRECTION = range(2)
+
+CHUNK_SIZE = 1 << 16  # raw bytes of plies above which a chunk is written
+
+GAME_LOG = None  # GameLog of the game played by this process, if recorded
+
+
+def encode_move(player, move):
+    if player == DIRECTION:
+        return move
+    i, j, log2_value = move
+    return ((rules.SIZE * i + j) << 1) | (log2_value - 1)
+
+
+def decode_move(player, code):
+    if player == DIRECTION:
+        return code
+    cell = code >> 1
+    return (cell // rules.SIZE, cell % rules.SIZE, (code & 1) + 1)
+
+
+class GameLog:
+    """plies of a game, packed as they are played"""
+
+    def __init__(self, game_id=0):
+        import bitboard  # not needed to read records
+        self.game_id = game_id
+        self.data = bytearray()
+        self.plies = 0
+        self.to_int = bitboard.to_int
+
+    def ply_int(self, b, player, move):
+        """record 'move' of 'player' on the packed board 'b'"""
+        self.data += PLY.pack(b, player, encode_move(player, move))
+        self.plies += 1
+
+    def ply(self, board, player, move):
+        """record 'move' of 'player' on the list-of-lists 'board'"""
+        self.ply_int(self.to_int(board), player, move)
+
+
+class Writer:
+
+    def __init__(self, path, compress=6, chunk_size=CHUNK_SIZE):
+        """record games in the file 'path', appending to it if it exists.
+           'compress' is the zlib level of the chunks (0 for none) of a new file."""
+        self.chunk_size = chunk_size
+        self.games = []  # GameLog of the chunk being filled
+        self.size = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            self.compress, self.index, end = read_index(self.file)
+            self.file.seek(end)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'wb')
+            self.compress = compress
+            self.index = []
+            self.file.write(HEADER.pack(MAGIC, VERSION, compress))
+
+    def __len__(self):
+        return len(self.index) + len(self.games)
+
+    def add(self, log):
+        """add the game of GameLog 'log'"""
+        self.games.append(log)
+        self.size += len(log.data)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """write the chunk of the pending games"""
+        if not self.games:
+            return
+        table = b''.join(GAME.pack(log.game_id, log.plies) for log in self.games)
+        raw = table + b''.join(bytes(log.data) for log in self.games)
+        stored = zlib.compress(raw, self.compress) if self.compress else raw
+        offset = self.file.tell()
+        self.file.write(CHUNK.pack(len(raw), len(stored), len(self.games)))
+        self.file.write(stored)
+        first = 0
+        for log in self.games:
+            self.index.append((offset, first, log.plies, log.game_id))
+            first += log.plies
+        self.games = []
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(ENTRY.pack(*entry))
+        self.file.write(FOOTER.pack(offset, len(self.index), END))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------
+# reading
+
+
+def read_header(f):
+    f.seek(0)
+    magic, version, compress = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a game record of version {0}".format(VERSION))
+    return compress
+
+
+def read_chunk(f, compress):
+    """(number of games, raw data) of the chunk at the position of 'f',
+       or None if it is truncated"""
+    head = f.read(CHUNK.size)
+    if len(head) < CHUNK.size:
+        return None
+    raw_size, stored_size, games = CHUNK.unpack(head)
+    stored = f.read(stored_size)
+    if len(stored) < stored_size:
+        return None
+    if not compress:
+        return games, stored
+    try:
+        return games, zlib.decompress(stored)
+    except zlib.error:
+        return None
+
+
+def scan(f, compress):
+    """(index, end of the last complete chunk) from the chunks of 'f'"""
+    index = []
+    end = HEADER.size
+    f.seek(end)
+    while True:
+        chunk = read_chunk(f, compress)
+        if chunk is None:
+            break
+        games, data = chunk
+        first = 0
+        for k in range(games):
+            game_id, plies = GAME.unpack_from(data, k * GAME.size)
+            index.append((end, first, plies, game_id))
+            first += plies
+        end = f.tell()
+    return index, end
+
+
+def read_index(f):
+    """(compression, index, offset of the index) of the file 'f'"""
+    compress = read_header(f)
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size >= HEADER.size + FOOTER.size:
+        f.seek(size - FOOTER.size)
+        offset, games, end = FOOTER.unpack(f.read(FOOTER.size))
+        if end == END and offset + games * ENTRY.size + FOOTER.size == size:
+            f.seek(offset)
+            data = f.read(games * ENTRY.size)
+            return compress, [ENTRY.unpack_from(data, k * ENTRY.size)
+                              for k in range(games)], offset
+    index, end = scan(f, compress)
+    return compress, index, end
+
+
+class Reader:
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.compress, self.index, _ = read_index(self.file)
+        self.cache = None  # (offset, chunk) of the last chunk read
+
+    def __len__(self):
+        return len(self.index)
+
+    def game_id(self, n):
+        return self.index[n][3]
+
+    def chunk(self, offset):
+        """(number of games, raw data) of the chunk at 'offset'"""
+        if self.cache is None or self.cache[0] != offset:
+            self.file.seek(offset)
+            self.cache = offset, read_chunk(self.file, self.compress)
+        return self.cache[1]
+
+    def game(self, n):
+        """generate the plies (board, player, move) of the game of rank n,
+           where 'board' is a packed int (see bitboard.to_board)"""
+        offset, first, plies, _ = self.index[n]
+        games, data = self.chunk(offset)
+        pos = games * GAME.size + first * PLY.size
+        for _ in range(plies):
+            b, player, code = PLY.unpack_from(data, pos)
+            pos += PLY.size
+            yield b, player, decode_move(player, code)
+
+    def games(self, start=0):
+        """generate (game id, plies of the game) from the game of rank 'start'"""
+        for n in range(start, len(self.index)):
+            yield self.game_id(n), self.game(n)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
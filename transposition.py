@@ -0,0 +1,153 @@
+"""Transposition table for search players
+
+Boards are stored up to the 8 symmetries of the square (rotations and
+reflections): the key of a board is the smallest of its 8 symmetric
+bitboards (see bitboard.py), and the best direction stored with it is
+translated to and from the frame of this canonical board.
+
+The table holds at most 'size' entries. When it is full, an entry is
+evicted according to its policy:
+  'lru'   -- the least recently used entry
+  'depth' -- the shallowest of the SAMPLE least recently used entries
+and with the 'depth' policy, an entry is never replaced by a shallower one.
+"""
+
+from collections import OrderedDict
+from itertools import islice
+
+import rules
+import bitboard
+
+# bound types of a stored value
+EXACT, LOWER, UPPER = range(3)
+
+# players to play on a stored board
+TILE, DIRECTION = range(2)
+
+SAMPLE = 8  # entries looked at by the 'depth' eviction policy
+
+# For a symmetry s: s(move_dir(d, b)) == move_dir(MAP[d], s(b))
+_ID = tuple(rules.DIRECTIONS)
+_MIRROR = (rules.DOWN, rules.RIGHT, rules.LEFT, rules.UP)
+_FLIP = (rules.UP, rules.LEFT, rules.RIGHT, rules.DOWN)
+_TRANSPOSE = (rules.RIGHT, rules.UP, rules.DOWN, rules.LEFT)
+
+
+def _compose(first, then):
+    return tuple(then[first[d]] for d in rules.DIRECTIONS)
+
+
+# direction maps of the 8 symmetries, in the order of symmetries() below
+DIR_MAPS = (_ID, _MIRROR, _FLIP, _compose(_MIRROR, _FLIP),
+            _TRANSPOSE,
+            _compose(_MIRROR, _TRANSPOSE),
+            _compose(_FLIP, _TRANSPOSE),
+            _compose(_compose(_MIRROR, _FLIP), _TRANSPOSE))
+DIR_UNMAPS = tuple(tuple(m.index(d) for d in rules.DIRECTIONS) for m in DIR_MAPS)
+
+
+def symmetries(b):
+    """the 8 symmetric versions of the packed board 'b'"""
+    m = bitboard.mirror(b)
+    f = bitboard.flip(b)
+    fm = bitboard.flip(m)
+    t = bitboard.transpose
+    return (b, m, f, fm, t(b), t(m), t(f), t(fm))
+
+
+def canonical(b):
+    """(canonical board, index of the symmetry mapping 'b' to it)"""
+    variants = symmetries(b)
+    c = min(variants)
+    return c, variants.index(c)
+
+
+class TranspositionTable:
+
+    def __init__(self, size, policy='depth'):
+        assert policy in ('lru', 'depth')
+        self.size = size
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, board, turn):
+        """key of the list-of-lists 'board' with 'turn' to play,
+           or None if the board does not fit in a bitboard"""
+        if len(board) != bitboard.SIZE:
+            return None
+        try:
+            b = bitboard.to_int(board)
+        except ValueError:
+            return None
+        c, sym = canonical(b)
+        return (c << 1) | turn, sym
+
+    def probe(self, key, depth):
+        """(value, bound, best direction) stored for 'key' by a search of at
+           least 'depth' plies, or None"""
+        if key is None:
+            return None
+        self.probes += 1
+        k, sym = key
+        entry = self.entries.get(k)
+        if entry is None or entry[0] < depth:
+            return None
+        self.hits += 1
+        self.entries.move_to_end(k)
+        _, value, bound, best = entry
+        if best is not None:
+            best = DIR_UNMAPS[sym][best]
+        return value, bound, best
+
+    def best_direction(self, key):
+        """best direction stored for 'key' whatever its depth, or None.
+           Used to order moves, it is not counted as a probe."""
+        if key is None:
+            return None
+        k, sym = key
+        entry = self.entries.get(k)
+        if entry is None or entry[3] is None:
+            return None
+        return DIR_UNMAPS[sym][entry[3]]
+
+    def store(self, key, depth, value, bound=EXACT, best=None):
+        if key is None:
+            return
+        k, sym = key
+        old = self.entries.get(k)
+        if old is not None:
+            if self.policy == 'depth' and old[0] > depth:
+                return
+            self.entries.move_to_end(k)
+        elif len(self.entries) >= self.size:
+            self.evict()
+        if best is not None:
+            best = DIR_MAPS[sym][best]
+        self.entries[k] = (depth, value, bound, best)
+        self.stores += 1
+
+    def evict(self):
+        if self.policy == 'lru':
+            self.entries.popitem(last=False)
+        else:
+            oldest = islice(self.entries.items(), SAMPLE)
+            k = min(oldest, key=lambda item: item[1][0])[0]
+            del self.entries[k]
+        self.evictions += 1
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "TranspositionTable({0}/{1} entries, {2} probes, hit rate {3:.1%}, {4} evictions)".format(
+            len(self), self.size, self.probes, self.hit_rate(), self.evictions)
@@ -0,0 +1,180 @@
+#! /usr/bin/env python3
+"""Vectorized environment of 2048: K worker processes stepping M games each
+
+The games are env.Env games. Their observations, legal masks, rewards and
+done flags live in shared memory arrays, read by the learner without any
+pickling: obs is (K*M, SIZE, SIZE), legal is (K*M, 4), and rewards, dones,
+scores and moves are (K*M,). Games of worker w are the rows w*M to w*M+M-1.
+
+A finished game is reset at once: after a step, dones[k] tells that game k
+has ended, scores[k] and moves[k] are the merge score and the number of
+moves of that ended game, while obs[k] and legal[k] are already those of
+the next game. Arrays are overwritten by the next step: copy them to keep
+them.
+
+    with VecEnv(workers=4, games=64, seed=0) as venv:
+        obs, legal = venv.reset()
+        for _ in range(1000):
+            obs, rewards, dones, legal = venv.step(policy(obs, legal))
+"""
+
+import ctypes
+import os
+import time
+from multiprocessing import Process, Pipe, RawArray
+
+import numpy as np
+
+import rules
+import config
+import env
+
+# name -> (ctypes type, numpy dtype, shape of a game)
+ARRAYS = {'obs': (ctypes.c_uint8, np.uint8, (rules.SIZE, rules.SIZE)),
+          'legal': (ctypes.c_bool, np.bool_, (len(rules.DIRECTIONS),)),
+          'actions': (ctypes.c_int8, np.int8, ()),
+          'rewards': (ctypes.c_int64, np.int64, ()),
+          'dones': (ctypes.c_bool, np.bool_, ()),
+          'scores': (ctypes.c_int64, np.int64, ()),
+          'moves': (ctypes.c_int64, np.int64, ())}
+
+
+def views(raw, n):
+    """numpy arrays of n games over the shared arrays 'raw'"""
+    return {name: np.frombuffer(raw[name], dtype=dtype).reshape((n,) + shape)
+            for name, (_, dtype, shape) in ARRAYS.items()}
+
+
+def game_seed(seed, worker, game):
+    """seed of the first game of slot 'game' of 'worker' (None if unseeded).
+       The following games of the slot go on with its random generator."""
+    if seed is None:
+        return None
+    return "{0}:{1}:{2}".format(seed, worker, game)
+
+
+def worker_loop(conn, worker, games, raw, seed, board, tile_first):
+    arrays = views(raw, len(raw['dones']))
+    first = worker * games
+    rows = range(first, first + games)
+    obs, legal = arrays['obs'], arrays['legal']
+    actions, rewards, dones = arrays['actions'], arrays['rewards'], arrays['dones']
+    scores, moves = arrays['scores'], arrays['moves']
+    envs = [env.Env(board=board, tile_first=tile_first, obs=obs[k], legal=legal[k])
+            for k in rows]
+    try:
+        while True:
+            cmd = conn.recv()
+            if cmd == 'step':
+                for k, e in zip(rows, envs):
+                    _, reward, done, info = e.step(actions[k])
+                    rewards[k] = reward
+                    dones[k] = done
+                    if done:
+                        scores[k] = info['score']
+                        moves[k] = info['moves']
+                        e.reset()
+            elif cmd == 'reset':
+                for m, (k, e) in enumerate(zip(rows, envs)):
+                    e.reset(game_seed(seed, worker, m))
+                    rewards[k] = 0
+                    dones[k] = False
+            else:  # 'close'
+                break
+            conn.send(None)
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+class VecEnv:
+
+    def __init__(self, workers=None, games=1, seed=None, board=None, tile_first=True):
+        """'workers' processes (default: config.WORKERS, 0 for one per core)
+           each playing 'games' games, from 'board' as in env.Env"""
+        if workers is None:
+            workers = config.WORKERS
+        if not workers:
+            workers = os.cpu_count()
+        self.workers = workers
+        self.games = games
+        self.num_envs = n = workers * games
+        raw = {name: RawArray(ctype, n * int(np.prod(shape, dtype=int)))
+               for name, (ctype, _, shape) in ARRAYS.items()}
+        for name, array in views(raw, n).items():
+            setattr(self, name, array)
+        self.conns = []
+        self.processes = []
+        for w in range(workers):
+            conn, child = Pipe()
+            p = Process(target=worker_loop,
+                        args=(child, w, games, raw, seed, board, tile_first),
+                        daemon=True)
+            p.start()
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(p)
+
+    def call(self, cmd):
+        for conn in self.conns:
+            conn.send(cmd)
+        for conn in self.conns:
+            conn.recv()
+
+    def reset(self):
+        """start all the games (seeded games restart from their seeds).
+           Returns (obs, legal)"""
+        self.call('reset')
+        return self.obs, self.legal
+
+    def step(self, actions):
+        """play actions[k] in game k, then a tile. Finished games are reset.
+           Returns (obs, rewards, dones, legal)"""
+        self.actions[:] = actions
+        self.call('step')
+        return self.obs, self.rewards, self.dones, self.legal
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self.processes:
+            p.join(config.AUTOPLAYER_STOP_WAIT)
+            if p.is_alive():
+                p.terminate()
+        self.conns = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def random_actions(legal, rng):
+    """uniform choice among the legal directions of each game"""
+    keys = rng.random(legal.shape)
+    keys[~legal] = -1
+    return keys.argmax(axis=1)
+
+
+# CODE TO RUN when the file is used as a single executable
+if __name__ == "__main__":
+    STEPS = 1000
+    rng = np.random.default_rng(config.SEED)
+    with VecEnv(games=64, seed=config.SEED) as venv:
+        obs, legal = venv.reset()
+        INIT_TIME = time.time()
+        finished = []
+        for _ in range(STEPS):
+            obs, rewards, dones, legal = venv.step(random_actions(legal, rng))
+            finished.extend(venv.scores[dones])
+        elapsed = time.time() - INIT_TIME
+    print("WORKERS: {0} -- GAMES: {1}".format(venv.workers, venv.num_envs))
+    print("TOTAL TIME:", elapsed,
+          "-- STEPS PER SECOND:", STEPS * venv.num_envs / elapsed)
+    if finished:
+        print("FINISHED GAMES: {0} -- MEAN MERGE SCORE: {1}".format(
+            len(finished), sum(finished) / len(finished)))